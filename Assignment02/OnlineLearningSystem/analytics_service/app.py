@@ -1,8 +1,16 @@
-from flask import Flask, jsonify
-from pymongo import MongoClient
+from flask import Flask, request, jsonify
+import os
+import logging
+from pymongo import MongoClient, DESCENDING, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+import click
 from flasgger import Swagger, swag_from
+from common.indexes import ensure_indexes
+from common.json_provider import register_json_provider
 
 app = Flask(__name__)
+register_json_provider(app)
+logger = logging.getLogger(__name__)
 
 # Swagger configuration
 swagger_config = {
@@ -24,11 +32,44 @@ swagger_config = {
 swagger = Swagger(app, config=swagger_config)
 
 # Connect to MongoDB
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 
 enrollments_collection = db.enrollments
 courses_collection = db.courses
+# Maintained incrementally by enrollment_service; seeded at startup while empty,
+# rebuild with `flask rebuild-counters` if they drift
+enrollment_counts_collection = db.course_enrollment_counts
+ensure_indexes(db, "enrollments", "courses", "course_enrollment_counts")
+
+def actual_enrollment_counts():
+    """course_id -> number of enrollments, counted from the enrollments collection"""
+    pipeline = [{"$group": {"_id": "$course_id", "count": {"$sum": 1}}}]
+    return {item["_id"]: item["count"] for item in enrollments_collection.aggregate(pipeline)}
+
+def seed_enrollment_counts():
+    """On first deploy the counters start empty while enrollments already exist; fill them in"""
+    if enrollment_counts_collection.find_one({}, {"_id": 1}) is not None:
+        return
+    counts = actual_enrollment_counts()
+    if not counts:
+        return
+    try:
+        enrollment_counts_collection.bulk_write([
+            UpdateOne({"course_id": course_id}, {"$set": {"count": count}}, upsert=True)
+            for course_id, count in counts.items()
+        ], ordered=False)
+    except BulkWriteError as e:
+        # Another worker seeding at the same time wins the upsert race; its counts are the same
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+    logger.info("Seeded enrollment counters for %d course(s)", len(counts))
+
+seed_enrollment_counts()
+
+# Default and maximum size of the /stats/popular_courses list
+DEFAULT_POPULAR_LIMIT = 5
+MAX_POPULAR_LIMIT = 100
 
 @app.route('/stats/enrollments', methods=['GET'])
 @swag_from({
@@ -50,20 +91,26 @@ courses_collection = db.courses
     }
 })
 def enrollment_stats():
-    pipeline = [
-        {"$group": {"_id": "$course_id", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    stats = list(enrollments_collection.aggregate(pipeline))
-    for stat in stats:
-        stat["course_id"] = stat.pop("_id")
-    return jsonify(stats)
+    stats = enrollment_counts_collection.find(
+        {"count": {"$gt": 0}},
+        {"_id": 0, "course_id": 1, "count": 1}
+    ).sort("count", DESCENDING)
+    return jsonify(list(stats))
 
 @app.route('/stats/popular_courses', methods=['GET'])
 @swag_from({
     'tags': ['Statistics'],
-    'summary': 'Get top 5 most popular courses',
-    'description': 'Returns a list of the top 5 courses with the highest number of enrollments, including course titles.',
+    'summary': 'Get the most popular courses',
+    'description': 'Returns the top N courses with the highest number of enrollments, including course titles.',
+    'parameters': [
+        {
+            'name': 'limit',
+            'in': 'query',
+            'required': False,
+            'description': f'Number of courses to return (default {DEFAULT_POPULAR_LIMIT}, max {MAX_POPULAR_LIMIT})',
+            'schema': {'type': 'integer', 'minimum': 1, 'maximum': MAX_POPULAR_LIMIT}
+        }
+    ],
     'responses': {
         200: {
             'description': 'List of popular courses with titles and enrollment counts',
@@ -83,32 +130,64 @@ def enrollment_stats():
                     ]
                 }
             }
-        }
+        },
+        400: {'description': 'limit is not an integer between 1 and the maximum'}
     }
 })
 def popular_courses():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_POPULAR_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_POPULAR_LIMIT:
+        return jsonify({"error": f"limit must be an integer between 1 and {MAX_POPULAR_LIMIT}"}), 400
+
     pipeline = [
-        {"$group": {"_id": "$course_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 0}}},
         {"$sort": {"count": -1}},
-        {"$limit": 5}
+        {"$limit": limit},
+        {"$lookup": {
+            "from": courses_collection.name,
+            "localField": "course_id",
+            "foreignField": "course_id",
+            "pipeline": [{"$project": {"_id": 0, "title": 1}}, {"$limit": 1}],
+            "as": "course"
+        }},
+        {"$project": {
+            "_id": 0,
+            "course_id": 1,
+            "course_title": {"$ifNull": [{"$first": "$course.title"}, "Unknown"]},
+            "enrollments": "$count"
+        }}
     ]
-    popular = list(enrollments_collection.aggregate(pipeline))
-    course_titles = {}
-    
-    for item in popular:
-        course_id = item['_id']
-        course = courses_collection.find_one({"course_id": course_id})
-        course_titles[course_id] = course['title'] if course else "Unknown"
-
-    result = [
-        {
-            "course_id": item['_id'],
-            "course_title": course_titles[item['_id']],
-            "enrollments": item['count']
-        }
-        for item in popular
-    ]
-    return jsonify(result)
+    return jsonify(list(enrollment_counts_collection.aggregate(pipeline)))
+
+
+@app.cli.command('rebuild-counters')
+@click.option('--dry-run', is_flag=True, help='Only report drift, do not rewrite the counters.')
+def rebuild_counters(dry_run):
+    """Recompute course_enrollment_counts from the enrollments collection."""
+    actual = actual_enrollment_counts()
+    stored = {
+        item["course_id"]: item.get("count", 0)
+        for item in enrollment_counts_collection.find({}, {"_id": 0, "course_id": 1, "count": 1})
+    }
+
+    operations = []
+    for course_id in actual.keys() | stored.keys():
+        expected, current = actual.get(course_id, 0), stored.get(course_id)
+        if current == expected:
+            continue
+        click.echo(f"course_id={course_id!r}: stored={current} actual={expected}")
+        if expected:
+            operations.append(UpdateOne({"course_id": course_id}, {"$set": {"count": expected}}, upsert=True))
+        else:
+            operations.append(DeleteOne({"course_id": course_id}))
+
+    click.echo(f"{len(operations)} counter(s) drifted across {len(actual)} enrolled course(s)")
+    if operations and not dry_run:
+        enrollment_counts_collection.bulk_write(operations, ordered=False)
+        click.echo("Counters rebuilt")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5005)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5005)))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compare sequential per-course lookups with the async fan-out in enrollment_service.
+Uses a local stub course service with 50 ms latency; a few ids hang for 10 s to
+show that the fan-out returns partial results at its deadline.
+"""
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "enrollment_service"))
+
+import async_client  # noqa: E402
+from benchmarks.stub_course_service import StubCourseService  # noqa: E402
+from common.resilience import ResilientClient  # noqa: E402
+
+# Configuration
+ENROLLMENT_COUNTS = [1, 10, 40, 100]
+LATENCY = 0.05
+DEADLINE = 1.0
+SLOW_IDS = {7, 33}
+
+
+def sequential(base_url, course_ids):
+    session = requests.Session()
+    titles = {}
+    for course_id in course_ids:
+        try:
+            response = session.get(f"{base_url}/course/{course_id}", timeout=DEADLINE)
+            titles[course_id] = response.json().get("title") if response.ok else "Not Found"
+        except requests.exceptions.RequestException:
+            titles[course_id] = async_client.ERROR_TITLE
+    return titles
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    stub = StubCourseService(latency=LATENCY, slow_ids=SLOW_IDS).start()
+    # Lookups that only miss the deadline are not breaker failures, so the circuit stays closed
+    client = ResilientClient("stub-course-service", stub.url)
+    print(f"📊 Course lookups at {LATENCY * 1000:.0f} ms per call, deadline {DEADLINE:.1f} s")
+    print("=" * 60)
+    print(f"{'enrollments':>12} {'sequential ms':>15} {'async ms':>10} {'timed out':>10}")
+    try:
+        for count in ENROLLMENT_COUNTS:
+            course_ids = list(range(count))
+            fast_ids = [cid for cid in course_ids if cid not in SLOW_IDS]
+            seq_ms, _ = timed(sequential, stub.url, fast_ids)
+            async_ms, titles = timed(async_client.fetch_course_titles, course_ids, client, DEADLINE)
+            errors = sum(1 for title in titles.values() if title == async_client.ERROR_TITLE)
+            print(f"{count:>12} {seq_ms:>15.1f} {async_ms:>10.1f} {errors:>10}")
+    finally:
+        stub.stop()
+    print("\nSequential timings skip the slow ids; with them each would add the full timeout.")
+
+
+if __name__ == "__main__":
+    main()
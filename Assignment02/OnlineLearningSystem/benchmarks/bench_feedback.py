@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark /feedback/<course_id> pages as a course grows to 100k+ comments: the
+first page, a page deep into the history, and a one-day since/until window.
+Run against the docker-compose stack (mongo is published on port 27016).
+"""
+import datetime
+import statistics
+import time
+
+import requests
+from pymongo import MongoClient
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+FEEDBACK_API = "http://localhost:5006"
+COURSE_ID = "bench-feedback"
+FEEDBACK_COUNTS = [1_000, 10_000, 100_000, 200_000]
+PAGE_SIZE = 50
+DEEP_PAGES = 20
+REQUESTS_PER_SIZE = 20
+START = datetime.datetime(2024, 1, 1)
+
+
+def load_feedback(db, count):
+    db.feedbacks.delete_many({"course_id": COURSE_ID})
+    # Spread over a year so a one-day window always holds a handful of comments
+    step = datetime.timedelta(days=365) / count
+    for start in range(0, count, 10_000):
+        db.feedbacks.insert_many([
+            {"username": f"learner{i}", "course_id": COURSE_ID, "rating": 1 + i % 5,
+             "comment": "Clear explanations, more exercises please.", "submitted_at": START + step * i}
+            for i in range(start, min(start + 10_000, count))
+        ])
+
+
+def page(**params):
+    response = requests.get(f"{FEEDBACK_API}/feedback/{COURSE_ID}", params={"limit": PAGE_SIZE, **params})
+    response.raise_for_status()
+    return response.json()["next"]
+
+
+def deep_token():
+    token = None
+    for _ in range(DEEP_PAGES):
+        token = page(**({"next": token} if token else {}))
+    return token
+
+
+def p50(fn):
+    samples = []
+    for _ in range(REQUESTS_PER_SIZE):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    db = MongoClient(MONGO_URL).online_learning
+    window = {"since": "2024-07-01T00:00:00", "until": "2024-07-02T00:00:00"}
+
+    print("📊 /feedback/<course_id> latency (p50 ms) by comments per course")
+    print("=" * 64)
+    print(f"{'comments':>10} {'first page':>12} {f'page {DEEP_PAGES + 1}':>12} {'one-day window':>16}")
+    try:
+        for count in FEEDBACK_COUNTS:
+            load_feedback(db, count)
+            token = deep_token()
+            first = p50(page)
+            deep = p50(lambda: page(next=token))
+            windowed = p50(lambda: page(**window))
+            print(f"{count:>10} {first:>12.1f} {deep:>12.1f} {windowed:>16.1f}")
+    finally:
+        db.feedbacks.delete_many({"course_id": COURSE_ID})
+    print("\nEvery column should stay flat: each page is an index range scan of at most limit + 1 entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of jsonify() on large lists of Mongo-shaped documents, comparing
+Flask's default provider with common.json_provider.FastJSONProvider. Runs in-process.
+"""
+import datetime
+import decimal
+import os
+import statistics
+import sys
+import time
+
+from bson import ObjectId
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common.json_provider import FastJSONProvider  # noqa: E402
+
+# Configuration
+LIST_SIZES = [1_000, 10_000, 100_000]
+REPEATS = 5
+
+
+class DefaultWithObjectId(DefaultJSONProvider):
+    """The stock provider plus the ObjectId handling it lacks, so both sides do the same work"""
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return DefaultJSONProvider.default(obj)
+
+
+def documents(count):
+    now = datetime.datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "course_id": i,
+            "title": f"Course {i}",
+            "description": "An introduction to the subject, with weekly assignments and a final project.",
+            "instructor": "Jane Doe",
+            "price": decimal.Decimal("49.99"),
+            "created_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def time_jsonify(provider_class, docs):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    samples = []
+    with app.app_context():
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            response = jsonify(docs)
+            response.get_data()
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(response.get_data())
+
+
+def main():
+    print("📊 jsonify() of Mongo documents, median of 5 runs")
+    print("=" * 64)
+    print(f"{'documents':>10} {'default ms':>12} {'orjson ms':>12} {'speedup':>9} {'bytes':>12}")
+    for count in LIST_SIZES:
+        docs = documents(count)
+        default_ms, _ = time_jsonify(DefaultWithObjectId, docs)
+        fast_ms, size = time_jsonify(FastJSONProvider, docs)
+        print(f"{count:>10} {default_ms:>12.1f} {fast_ms:>12.1f} {default_ms / fast_ms:>8.1f}x {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark /login latency under concurrent load now that passwords are scrypt
+hashes verified in a process pool. While logins run, a probe thread times a
+cheap endpoint to show the serving threads stay responsive.
+Run against the docker-compose stack (mongo is published on port 27016).
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from pymongo import MongoClient
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+USER_API = "http://localhost:5001"
+USERNAME_PREFIX = "bench_login_"
+USER_COUNT = 200
+CONCURRENCY_LEVELS = [1, 8, 32, 64]
+LOGINS_PER_LEVEL = 400
+
+
+def login(session, i):
+    username = f"{USERNAME_PREFIX}{i % USER_COUNT}"
+    start = time.perf_counter()
+    response = session.post(f"{USER_API}/login", json={"username": username, "password": "secret"})
+    return (time.perf_counter() - start) * 1000, response.status_code
+
+
+def probe(stop, samples):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(f"{USER_API}/testusers", params={"limit": 1})
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+
+
+def run_level(concurrency):
+    local = threading.local()
+
+    def worker(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return login(local.session, i)
+
+    stop, probe_samples = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(stop, probe_samples))
+    prober.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(worker, range(LOGINS_PER_LEVEL)))
+    finally:
+        stop.set()
+        prober.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for ms, status in results if status == 200)
+    errors = sum(1 for _, status in results if status != 200)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+    p50 = statistics.median(latencies) if latencies else float("nan")
+    probe_p50 = statistics.median(probe_samples) if probe_samples else float("nan")
+    return p50, p99, len(latencies) / elapsed, errors, probe_p50
+
+
+def main():
+    db = MongoClient(MONGO_URL).online_learning
+    db.users.delete_many({"username": {"$regex": f"^{USERNAME_PREFIX}"}})
+
+    print("📊 /login latency under concurrent load")
+    print("=" * 72)
+    try:
+        # Half register (hashed up front), half are legacy plaintext rows rehashed on first login
+        for i in range(USER_COUNT):
+            username = f"{USERNAME_PREFIX}{i}"
+            if i % 2:
+                db.users.insert_one({"username": username, "password": "secret"})
+            else:
+                requests.post(f"{USER_API}/register", json={"username": username, "password": "secret"}).raise_for_status()
+
+        print(f"{'concurrency':>12} {'p50 ms':>10} {'p99 ms':>10} {'logins/s':>10} {'errors':>8} {'probe p50':>10}")
+        for concurrency in CONCURRENCY_LEVELS:
+            p50, p99, rate, errors, probe_p50 = run_level(concurrency)
+            print(f"{concurrency:>12} {p50:>10.1f} {p99:>10.1f} {rate:>10.1f} {errors:>8} {probe_p50:>10.1f}")
+
+        legacy = db.users.count_documents({"username": {"$regex": f"^{USERNAME_PREFIX}"},
+                                           "password": {"$not": {"$regex": "^scrypt\\$"}}})
+        print(f"\nPlaintext passwords left after the run: {legacy}")
+    finally:
+        db.users.delete_many({"username": {"$regex": f"^{USERNAME_PREFIX}"}})
+    print("Errors are 503s from the bounded hash queue; raise PASSWORD_HASH_MAX_PENDING to trade them for latency.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark /my-courses/<username> latency as the number of enrollments grows.
+Run against the docker-compose stack (mongo is published on port 27016).
+"""
+import statistics
+import time
+
+import requests
+from pymongo import MongoClient
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+ENROLLMENT_API = "http://localhost:5003"
+COURSE_ID_BASE = 900000
+ENROLLMENT_COUNTS = [1, 10, 40, 100, 400]
+REQUESTS_PER_SIZE = 30
+
+
+def seed(db, username, count):
+    """Create `count` courses and enroll `username` in all of them"""
+    db.courses.delete_many({"course_id": {"$gte": COURSE_ID_BASE}})
+    db.enrollments.delete_many({"username": username})
+    db.courses.insert_many([
+        {"course_id": COURSE_ID_BASE + i, "title": f"Bench course {i}"}
+        for i in range(count)
+    ])
+    db.enrollments.insert_many([
+        {"username": username, "course_id": COURSE_ID_BASE + i}
+        for i in range(count)
+    ])
+
+
+def measure(username):
+    """Return per-request latencies in milliseconds"""
+    latencies = []
+    for _ in range(REQUESTS_PER_SIZE):
+        start = time.perf_counter()
+        response = requests.get(f"{ENROLLMENT_API}/my-courses/{username}")
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def main():
+    db = MongoClient(MONGO_URL).online_learning
+    username = f"bench_user_{int(time.time())}"
+
+    print("📊 /my-courses latency by enrollment count")
+    print("=" * 50)
+    print(f"{'enrollments':>12} {'p50 ms':>10} {'p95 ms':>10}")
+    try:
+        for count in ENROLLMENT_COUNTS:
+            seed(db, username, count)
+            latencies = sorted(measure(username))
+            p50 = statistics.median(latencies)
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{count:>12} {p50:>10.1f} {p95:>10.1f}")
+    finally:
+        db.courses.delete_many({"course_id": {"$gte": COURSE_ID_BASE}})
+        db.enrollments.delete_many({"username": username})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Throughput of rendering and storing 10k certificate PDFs with the process pool
+certificate_service uses, at several pool sizes. Runs in-process against a
+temporary artifact directory, no docker-compose stack needed.
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "certificate_service"))
+
+import rendering  # noqa: E402
+
+# Configuration
+CERTIFICATE_COUNT = 10_000
+POOL_SIZES = sorted({1, 2, 4, os.cpu_count() or 1})
+CHUNK_SIZE = 100
+
+
+def render_and_store(i, directory):
+    data = rendering.render_pdf(f"Learner {i}", f"Course {i % 500}", "2024-06-01", f"{i:024x}")
+    return rendering.store_artifact(data, directory)
+
+
+def render_chunk(start, directory):
+    return [render_and_store(i, directory) for i in range(start, min(start + CHUNK_SIZE, CERTIFICATE_COUNT))]
+
+
+def run(workers, directory):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Warm the workers up so spawn time is not counted
+        list(pool.map(render_chunk, [CERTIFICATE_COUNT] * workers, [directory] * workers))
+        start = time.perf_counter()
+        digests = [d for chunk in pool.map(render_chunk, range(0, CERTIFICATE_COUNT, CHUNK_SIZE),
+                                           [directory] * (CERTIFICATE_COUNT // CHUNK_SIZE + 1))
+                   for d in chunk]
+        return time.perf_counter() - start, len(set(digests))
+
+
+def main():
+    print(f"📊 Rendering {CERTIFICATE_COUNT} certificate PDFs")
+    print("=" * 56)
+    print(f"{'workers':>8} {'seconds':>10} {'renders/s':>12} {'artifacts':>12}")
+    for workers in POOL_SIZES:
+        directory = tempfile.mkdtemp(prefix="bench_render_")
+        try:
+            seconds, artifacts = run(workers, directory)
+        finally:
+            shutil.rmtree(directory)
+        print(f"{workers:>8} {seconds:>10.2f} {CERTIFICATE_COUNT / seconds:>12.0f} {artifacts:>12}")
+    print("\n/generate only enqueues; these numbers bound how fast the queue drains per service worker.")
+
+
+if __name__ == "__main__":
+    main()
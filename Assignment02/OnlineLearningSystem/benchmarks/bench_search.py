@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark /courses/search as the catalog grows to 100k courses, against the
+client-side filtering of the full /courses stream it replaces.
+Run against the docker-compose stack (mongo is published on port 27016).
+"""
+import random
+import statistics
+import time
+
+import requests
+from pymongo import MongoClient
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+COURSE_API = "http://localhost:5002"
+COURSE_ID_BASE = 10_000_000
+CATALOG_SIZES = [10_000, 50_000, 100_000]
+# Every catalog size has exactly this many courses mentioning the rare term
+RARE_TERM = "quasar"
+RARE_MATCHES = 20
+QUERIES_PER_SIZE = 20
+WORDS = ("python data science machine learning web design cloud security networks "
+         "algorithms statistics finance marketing biology chemistry physics history").split()
+
+
+def course(i, rare):
+    rng = random.Random(i)
+    title = " ".join(rng.choices(WORDS, k=3)).title()
+    description = " ".join(rng.choices(WORDS, k=25))
+    if rare:
+        description += f" {RARE_TERM}"
+    return {"course_id": COURSE_ID_BASE + i, "title": title, "description": description,
+            "instructor": rng.choice(["Ada Lovelace", "Alan Turing", "Grace Hopper"])}
+
+
+def load_catalog(db, size):
+    rare_ids = set(random.Random(size).sample(range(size), RARE_MATCHES))
+    db.courses.delete_many({"course_id": {"$gte": COURSE_ID_BASE}})
+    for start in range(0, size, 10_000):
+        db.courses.insert_many([course(i, i in rare_ids) for i in range(start, min(start + 10_000, size))])
+
+
+def p50(fn):
+    samples = []
+    for _ in range(QUERIES_PER_SIZE):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def indexed_search(term):
+    requests.get(f"{COURSE_API}/courses/search", params={"q": term, "limit": 20}).raise_for_status()
+
+
+def client_side_filter(term):
+    with requests.get(f"{COURSE_API}/courses", params={"format": "ndjson"}, stream=True) as response:
+        matches = [line for line in response.iter_lines() if term.encode() in line.lower()]
+    return matches
+
+
+def main():
+    db = MongoClient(MONGO_URL).online_learning
+
+    print("📊 Course search latency (p50 ms) by catalog size")
+    print("=" * 64)
+    print(f"{'courses':>10} {'rare term':>12} {'common term':>12} {'client filter':>14}")
+    try:
+        for size in CATALOG_SIZES:
+            load_catalog(db, size)
+            rare = p50(lambda: indexed_search(RARE_TERM))
+            common = p50(lambda: indexed_search("python"))
+            scan = p50(lambda: client_side_filter(RARE_TERM)) if size <= 50_000 else float("nan")
+            print(f"{size:>10} {rare:>12.1f} {common:>12.1f} {scan:>14.1f}")
+    finally:
+        db.courses.delete_many({"course_id": {"$gte": COURSE_ID_BASE}})
+    print(f"\nThe rare term matches {RARE_MATCHES} courses at every size; its latency should stay flat.")
+
+
+if __name__ == "__main__":
+    main()
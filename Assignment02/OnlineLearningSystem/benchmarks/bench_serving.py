@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compare throughput of the Werkzeug dev server (python app.py) with gunicorn
+(common/gunicorn_conf.py) for course_service. Both are started locally against the
+docker-compose mongo (published on port 27016).
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Configuration
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVICE_DIR = os.path.join(ROOT, "course_service")
+MONGO_URL = "mongodb://localhost:27016/"
+PATHS = ["/", "/course/1"]
+CONCURRENCY = 32
+DURATION = 10.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(mode, port):
+    env = dict(os.environ, PORT=str(port), MONGO_URL=MONGO_URL, PYTHONPATH=ROOT)
+    if mode == "dev":
+        command = [sys.executable, "app.py"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "common", "gunicorn_conf.py"),
+                   "--access-logfile", "/dev/null", "app:app"]
+    process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=0.5)
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def hammer(url):
+    """Issue requests from CONCURRENCY threads for DURATION seconds; return latencies in ms"""
+    deadline = time.perf_counter() + DURATION
+
+    def worker(_):
+        session = requests.Session()
+        latencies = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            session.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        return sorted(latency for result in pool.map(worker, range(CONCURRENCY)) for latency in result)
+
+
+def main():
+    print(f"📊 course_service throughput, {CONCURRENCY} concurrent clients, {DURATION:.0f} s per run")
+    print("=" * 64)
+    print(f"{'server':>10} {'path':>12} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for mode in ("dev", "gunicorn"):
+        port = free_port()
+        process = start(mode, port)
+        try:
+            for path in PATHS:
+                latencies = hammer(f"http://127.0.0.1:{port}{path}")
+                p99 = latencies[int(len(latencies) * 0.99) - 1]
+                print(f"{mode:>10} {path:>12} {len(latencies) / DURATION:>10.0f} "
+                      f"{statistics.median(latencies):>10.1f} {p99:>10.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
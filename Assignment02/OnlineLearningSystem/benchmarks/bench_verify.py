@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Certificate verifications per second on one core: the bare signature check, and
+the full GET /verify/<signature> request through Flask's test client. Runs
+in-process; /verify itself never queries Mongo, but importing the app creates its
+indexes, so the docker-compose mongo (published on port 27016) must be up.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "certificate_service"))
+# Throwaway key for the benchmark's own signatures, unless one is configured
+os.environ.setdefault("CERTIFICATE_SECRET_KEY", "bench-verify-key")
+
+import signing  # noqa: E402
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+VERIFICATIONS = 20_000
+CERTIFICATE_COUNT = 1_000
+
+
+def signatures():
+    return [signing.sign_certificate({"user_id": f"learner{i}", "course_id": str(i % 50),
+                                      "issued_on": "2024-06-01 12:00:00"})
+            for i in range(CERTIFICATE_COUNT)]
+
+
+def rate(fn, tokens):
+    start = time.perf_counter()
+    for i in range(VERIFICATIONS):
+        fn(tokens[i % len(tokens)])
+    return VERIFICATIONS / (time.perf_counter() - start)
+
+
+def verify_over_http(client):
+    def verify(token):
+        response = client.get(f"/verify/{token}")
+        assert response.status_code == 200
+    return verify
+
+
+def main():
+    os.environ.setdefault("MONGO_URL", MONGO_URL)
+    from app import app
+    tokens = signatures()
+
+    print(f"📊 Certificate verification, {VERIFICATIONS} checks on a single core")
+    print("=" * 56)
+    print(f"{'path':<32} {'verifications/s':>20}")
+    print(f"{'signing.verify_certificate()':<32} {rate(signing.verify_certificate, tokens):>20.0f}")
+    print(f"{'GET /verify/<signature>':<32} {rate(verify_over_http(app.test_client()), tokens):>20.0f}")
+    print(f"\nScale by gunicorn workers (WEB_CONCURRENCY); cores available here: {os.cpu_count()}")
+
+
+if __name__ == "__main__":
+    main()
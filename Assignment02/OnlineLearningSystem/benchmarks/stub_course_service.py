@@ -0,0 +1,90 @@
+"""
+Local stand-in for course-service with injectable latency and failures, for benchmarks
+that must not depend on the docker-compose stack.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when a fan-out opens many at once
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a slow response close the socket before we write
+        pass
+
+
+class StubCourseService:
+    def __init__(self, latency=0.05, slow_ids=(), slow_latency=10.0, failure_rate=0.0):
+        self.latency = latency
+        self.slow_ids = set(slow_ids)
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _delay(self, course_ids):
+                stub.requests += 1
+                slow = any(course_id in stub.slow_ids for course_id in course_ids)
+                time.sleep(stub.slow_latency if slow else stub.latency)
+                return random.random() >= stub.failure_rate
+
+            def do_GET(self):
+                match = re.fullmatch(r"/course/(\d+)", self.path)
+                if not match:
+                    return self._reply(404, {"error": "Not found"})
+                course_id = int(match.group(1))
+                if not self._delay([course_id]):
+                    return self._reply(503, {"error": "Injected failure"})
+                self._reply(200, {"course_id": course_id, "title": f"Course {course_id}"})
+
+            def do_POST(self):
+                if self.path != "/courses/batch":
+                    return self._reply(404, {"error": "Not found"})
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                course_ids = [int(course_id) for course_id in body["course_ids"]]
+                if not self._delay(course_ids):
+                    return self._reply(503, {"error": "Injected failure"})
+                self._reply(200, {
+                    "courses": [{"course_id": cid, "title": f"Course {cid}"} for cid in course_ids],
+                    "missing": []
+                })
+
+        return Handler
@@ -1,36 +1,171 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
+from flask import Flask, request, jsonify, send_file, url_for
+import os
+import re
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pymongo import MongoClient, ReturnDocument, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import datetime
+import click
+import jwt
+import rendering
+import signing
+from common.indexes import ensure_indexes
+from common.json_provider import register_json_provider
 
 app = Flask(__name__)
+register_json_provider(app)
 
 # Connect to MongoDB (mongo is the service name in docker-compose)
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 certificates_collection = db.certificates
+enrollments_collection = db.enrollments
+certificate_jobs_collection = db.certificate_jobs
+ensure_indexes(db, "certificates", "enrollments")
 
-@app.route('/generate', methods=['POST'])
-def generate_certificate():
-    data = request.get_json()
+logger = logging.getLogger(__name__)
 
-    # Check if certificate already exists
-    existing = certificates_collection.find_one({
-        "user_id": data["user_id"],
-        "course_id": data["course_id"]
-    })
+# Artifact rendering runs in worker processes so /generate only has to enqueue it
+RENDER_WORKERS = int(os.environ.get("CERTIFICATE_RENDER_WORKERS", 2))
+# Jobs beyond this stay "queued" in Mongo instead of piling up in memory; they are claimed
+# whenever a slot frees up
+MAX_PENDING_RENDERS = int(os.environ.get("CERTIFICATE_MAX_PENDING_RENDERS", 1000))
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+# `flask render-pending` reclaims jobs left "rendering" this long, e.g. by a killed worker
+STALE_RENDER_SECONDS = 600
+# Certificates per insert_many in `flask issue-cohort`
+COHORT_BATCH_SIZE = 1000
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+_render_slots = threading.BoundedSemaphore(MAX_PENDING_RENDERS)
+# Claims queued jobs off the pool's result thread, which must not wait on Mongo
+_drainer = ThreadPoolExecutor(max_workers=1)
+
+def render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        # Created on first use, so each gunicorn worker gets its own pool after the fork;
+        # spawned rather than forked, so workers do not inherit this process's Mongo client
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=rendering.init_worker, initargs=(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"),))
+        return _render_pool
+
+def discard_render_pool(pool):
+    """Forget a broken pool so the next submit starts a fresh one"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False)
+
+def claim_fields():
+    return {"render_status": rendering.RENDERING, "render_claimed_at": datetime.datetime.utcnow()}
+
+def submit_render(user_id, course_id):
+    """Submit a claimed job while holding a render slot. If the pool cannot take it,
+    the slot is released and the job goes back to queued; returns whether it was submitted."""
+    pool = None
+    try:
+        pool = render_pool()
+        future = pool.submit(rendering.render_certificate, user_id, course_id)
+    except Exception as e:
+        # BrokenProcessPool after a worker died, RuntimeError after shutdown, or no pool at all
+        _render_slots.release()
+        if pool is not None:
+            discard_render_pool(pool)
+        certificates_collection.update_one(
+            {"user_id": user_id, "course_id": course_id, "render_status": rendering.RENDERING},
+            {"$set": {"render_status": rendering.QUEUED}, "$unset": {"render_claimed_at": ""}})
+        logger.error("Could not submit rendering of %s/%s: %s", user_id, course_id, e)
+        return False
+    future.add_done_callback(partial(render_done, user_id, course_id))
+    return True
 
-    if existing:
-        return jsonify({"message": "Certificate already exists", "certificate": existing}), 200
+def render_done(user_id, course_id, future):
+    _render_slots.release()
+    if future.exception():
+        logger.error("Rendering certificate %s/%s failed: %s", user_id, course_id, future.exception())
+    _drainer.submit(drain_render_queue)
 
+def drain_render_queue():
+    """Claim and submit queued jobs (overflow, cohort issuance) while render slots are free"""
+    while _render_slots.acquire(blocking=False):
+        try:
+            cert = certificates_collection.find_one_and_update(
+                {"render_status": rendering.QUEUED}, {"$set": claim_fields()},
+                projection={"_id": 0, "user_id": 1, "course_id": 1})
+        except Exception as e:
+            cert = None
+            logger.error("Could not claim queued renders: %s", e)
+        if not cert:
+            _render_slots.release()
+            return
+        if not submit_render(cert["user_id"], cert["course_id"]):
+            return
+
+def new_certificate(user_id, course_id):
     cert = {
-        "user_id": data["user_id"],
-        "course_id": data["course_id"],
+        "user_id": user_id,
+        "course_id": course_id,
         "issued_on": str(datetime.datetime.now()),
-        "certificate": f"Certificate for {data['user_id']} in course {data['course_id']}"
+        "certificate": f"Certificate for {user_id} in course {course_id}",
+        "render_status": rendering.QUEUED
     }
+    cert["signature"] = signing.sign_certificate(cert)
+    return cert
 
-    certificates_collection.insert_one(cert)
-    return jsonify(cert), 201
+def render_status(cert):
+    status = {"status": cert.get("render_status", rendering.QUEUED)}
+    if cert.get("artifact"):
+        status["artifact_url"] = url_for("download_artifact", digest=cert["artifact"])
+    return status
+
+@app.route('/generate', methods=['POST'])
+def generate_certificate():
+    data = request.get_json()
+    course_id = data.get("course_id")
+    if not isinstance(course_id, (int, str)) or isinstance(course_id, bool):
+        return jsonify({"error": "course_id must be an integer or a string"}), 400
+    # Stored as a string whatever the client sent, so 1 and "1" are one certificate under the unique index
+    key = {"user_id": data["user_id"], "course_id": str(course_id)}
+    cert = new_certificate(data["user_id"], key["course_id"])
+    # With a free render slot the new certificate is inserted already claimed; without one
+    # it stays queued until render_done drains the queue
+    has_slot = _render_slots.acquire(blocking=False)
+    if has_slot:
+        cert.update(claim_fields())
+
+    # One round trip: insert if absent, otherwise hand back what is stored. The unique
+    # (user_id, course_id) index makes concurrent upserts converge on a single document.
+    submitted = False
+    try:
+        try:
+            existing = certificates_collection.find_one_and_update(
+                key, {"$setOnInsert": cert}, projection={"_id": 0},
+                upsert=True, return_document=ReturnDocument.BEFORE)
+        except DuplicateKeyError:
+            # Lost an upsert race the server did not retry; the winner's document is there now
+            existing = certificates_collection.find_one(key, {"_id": 0})
+        if existing:
+            return jsonify({"message": "Certificate already exists", "certificate": existing}), 200
+        if has_slot:
+            # submit_render owns the slot from here, and releases it itself if the pool refuses
+            submitted = True
+            submit_render(cert["user_id"], cert["course_id"])
+    finally:
+        # On an existing certificate or any Mongo error; a leaked slot would never come back
+        if has_slot and not submitted:
+            _render_slots.release()
+    status_url = url_for("get_render_status", user_id=cert["user_id"], course_id=cert["course_id"])
+    return jsonify({**cert, "status_url": status_url}), 201
 
 @app.route('/certificate/<user_id>/<course_id>', methods=['GET'])
 def get_certificate(user_id, course_id):
@@ -42,9 +177,177 @@ def get_certificate(user_id, course_id):
     if not cert:
         return jsonify({"message": "Certificate not found"}), 404
 
-    cert['_id'] = str(cert['_id'])  # Convert ObjectId to string
     return jsonify(cert), 200
 
+@app.route('/verify/<signature>', methods=['GET'])
+def verify_certificate(signature):
+    # Pure CPU: the signature carries everything needed, so no database lookup
+    try:
+        certificate = signing.verify_certificate(signature)
+    except jwt.InvalidTokenError as e:
+        return jsonify({"valid": False, "message": f"Signature is invalid: {str(e)}"}), 400
+    return jsonify({"valid": True, "certificate": certificate}), 200
+
+@app.route('/certificate/<user_id>/<course_id>/status', methods=['GET'])
+def get_render_status(user_id, course_id):
+    cert = certificates_collection.find_one({"user_id": user_id, "course_id": course_id},
+                                            {"_id": 0, "render_status": 1, "artifact": 1})
+    if not cert:
+        return jsonify({"message": "Certificate not found"}), 404
+    return jsonify(render_status(cert)), 200
+
+@app.route('/cohort/<course_id>/progress', methods=['GET'])
+def get_cohort_progress(course_id):
+    job = certificate_jobs_collection.find_one({"_id": cohort_job_id(course_id)}, {"_id": 0})
+    if not job:
+        return jsonify({"message": "No cohort issuance job for this course"}), 404
+    return jsonify(job), 200
+
+@app.route('/artifacts/<digest>.pdf', methods=['GET'])
+def download_artifact(digest):
+    path = rendering.artifact_path(digest)
+    if not DIGEST_RE.match(digest) or not os.path.exists(path):
+        return jsonify({"message": "Artifact not found"}), 404
+    # The name is the content hash, so the bytes behind a URL can never change
+    response = send_file(path, mimetype=rendering.ARTIFACT_MIMETYPE, etag=digest,
+                         max_age=ARTIFACT_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.cli.command('render-pending')
+@click.option('--include-failed', is_flag=True, help='Also retry certificates whose rendering failed.')
+@click.option('--stale-after', default=STALE_RENDER_SECONDS, show_default=True,
+              help='Seconds after which a job still marked rendering is assumed lost and reclaimed.')
+def render_pending(include_failed, stale_after):
+    """Render certificates left queued by a restart, or lost while rendering."""
+    # None also matches certificates issued before rendering existed
+    statuses = [rendering.QUEUED, None] + ([rendering.FAILED] if include_failed else [])
+    stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=stale_after)
+    claimable = {"$or": [
+        {"render_status": {"$in": statuses}},
+        {"render_status": rendering.RENDERING, "render_claimed_at": {"$lt": stale}}
+    ]}
+    futures = []
+    # Claim each job before submitting it, so jobs the services are rendering right now are skipped
+    while True:
+        cert = certificates_collection.find_one_and_update(
+            claimable, {"$set": claim_fields()}, projection={"_id": 0, "user_id": 1, "course_id": 1})
+        if not cert:
+            break
+        futures.append(render_pool().submit(rendering.render_certificate, cert["user_id"], cert["course_id"]))
+    failed = sum(1 for future in futures if future.exception())
+    click.echo(f"Rendered {len(futures) - failed} certificate(s), {failed} failed")
+
+@app.cli.command('sign-certificates')
+@click.option('--batch-size', default=1000, show_default=True)
+def sign_certificates(batch_size):
+    """Add signatures to certificates issued before they were signed."""
+    unsigned = certificates_collection.find({"signature": {"$exists": False}},
+                                            {"user_id": 1, "course_id": 1, "issued_on": 1})
+    operations, signed = [], 0
+    for cert in unsigned:
+        operations.append(UpdateOne({"_id": cert["_id"]}, {"$set": {"signature": signing.sign_certificate(cert)}}))
+        if len(operations) == batch_size:
+            certificates_collection.bulk_write(operations, ordered=False)
+            signed += len(operations)
+            operations = []
+    if operations:
+        certificates_collection.bulk_write(operations, ordered=False)
+        signed += len(operations)
+    click.echo(f"Signed {signed} certificate(s)")
+
+def cohort_job_id(course_id):
+    return f"cohort:{course_id}"
+
+def uncertified_learners(course_id, after=None):
+    """Usernames enrolled in course_id without a certificate for it, in username order.
+
+    The set difference happens in one aggregation: each enrollment is joined against the
+    (user_id, course_id) index and only those with no match come back.
+    """
+    # Enrollments may hold the course_id as an int or as a string. /generate stores the string,
+    # but certificates issued before it normalised the type may hold the int
+    course_ids = [course_id] + ([int(course_id)] if course_id.lstrip("-").isdigit() else [])
+    match = {"course_id": {"$in": course_ids}}
+    if after is not None:
+        match["username"] = {"$gt": after}
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"username": ASCENDING}},
+        {"$lookup": {"from": "certificates", "localField": "username", "foreignField": "user_id",
+                     "pipeline": [{"$match": {"course_id": {"$in": course_ids}}}, {"$limit": 1},
+                                  {"$project": {"_id": 1}}],
+                     "as": "held"}},
+        {"$match": {"held": []}},
+        {"$project": {"_id": 0, "username": 1}}
+    ]
+    return (e["username"] for e in enrollments_collection.aggregate(pipeline, batchSize=COHORT_BATCH_SIZE))
+
+def insert_certificates(batch):
+    """Unordered insert; certificates issued concurrently by /generate are counted as skipped"""
+    try:
+        return len(certificates_collection.insert_many(batch, ordered=False).inserted_ids), 0
+    except BulkWriteError as e:
+        duplicates = sum(1 for error in e.details["writeErrors"] if error["code"] == 11000)
+        if duplicates != len(e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"], duplicates
+
+def issue_cohort(course_id, batch_size=COHORT_BATCH_SIZE, restart=False, progress=None):
+    """Issue certificates to every learner enrolled in course_id who lacks one.
+
+    Progress is checkpointed in certificate_jobs after every batch, so an interrupted run
+    resumes after the last username it finished.
+    """
+    job_id = cohort_job_id(course_id)
+    now = datetime.datetime.now()
+    job = None if restart else certificate_jobs_collection.find_one({"_id": job_id, "status": "running"})
+    if job is None:
+        job = {"_id": job_id, "course_id": course_id, "status": "running", "last_username": None,
+               "issued": 0, "skipped": 0, "started_at": now, "updated_at": now}
+        certificate_jobs_collection.replace_one({"_id": job_id}, job, upsert=True)
+
+    def save_job():
+        certificate_jobs_collection.update_one(
+            {"_id": job_id}, {"$set": {k: v for k, v in job.items() if k != "_id"}})
+
+    def flush(batch):
+        inserted, skipped = insert_certificates(batch)
+        job["issued"] += inserted
+        job["skipped"] += skipped
+        job["last_username"] = batch[-1]["user_id"]
+        job["updated_at"] = datetime.datetime.now()
+        save_job()
+        if progress:
+            progress(job)
+
+    batch = []
+    for username in uncertified_learners(course_id, job["last_username"]):
+        batch.append(new_certificate(username, course_id))
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    job.update(status="done", updated_at=datetime.datetime.now())
+    save_job()
+    return job
+
+@app.cli.command('issue-cohort')
+@click.argument('course_id')
+@click.option('--batch-size', default=COHORT_BATCH_SIZE, show_default=True)
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted run.')
+def issue_cohort_command(course_id, batch_size, restart):
+    """Issue certificates to every learner enrolled in COURSE_ID."""
+    job = issue_cohort(course_id, batch_size, restart,
+                       progress=lambda job: click.echo(f"issued={job['issued']} skipped={job['skipped']} "
+                                                       f"last_username={job['last_username']!r}"))
+    click.echo(f"Done: issued {job['issued']}, skipped {job['skipped']} already issued concurrently")
+    if job["issued"]:
+        click.echo("Artifacts are queued; run `flask render-pending` to render them")
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5004)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5004)))
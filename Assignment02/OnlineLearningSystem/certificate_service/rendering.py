@@ -0,0 +1,121 @@
+"""
+Certificate artifact rendering, run in a pool of worker processes.
+
+render_pdf() lays out a one-page PDF by hand, so rendering needs no extra
+dependencies. store_artifact() writes it content-addressed under ARTIFACT_DIR:
+the file name is the SHA-256 of its bytes, so a stored artifact never changes.
+"""
+import datetime
+import hashlib
+import os
+import tempfile
+
+from pymongo import MongoClient
+
+ARTIFACT_DIR = os.environ.get("CERTIFICATE_ARTIFACT_DIR", "/data/certificates")
+ARTIFACT_MIMETYPE = "application/pdf"
+
+# Render states stored on the certificate document. A job is claimed (queued -> rendering,
+# with render_claimed_at) before it is submitted, so no two submitters render it at once.
+QUEUED, RENDERING, DONE, FAILED = "queued", "rendering", "done", "failed"
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+
+
+def _pdf_text(value):
+    text = str(value).encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(name, course_title, issued_on, certificate_id):
+    """A4 landscape certificate as PDF bytes"""
+    lines = [
+        (30, 420, "Certificate of Completion"),
+        (14, 370, "This certifies that"),
+        (26, 330, name),
+        (14, 290, "has successfully completed"),
+        (22, 250, course_title),
+        (12, 170, f"Issued on {issued_on}"),
+        (9, 60, f"Certificate {certificate_id}"),
+    ]
+    # Helvetica averages about half an em per glyph, close enough to centre each line
+    content = "".join(
+        f"BT /F1 {size} Tf {(PAGE_WIDTH - size * 0.5 * len(text)) / 2:.1f} {y} Td ({_pdf_text(text)}) Tj ET\n"
+        for size, y, text in lines
+    ).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+         f"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>").encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"endstream",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def artifact_path(digest, directory=None):
+    directory = directory or ARTIFACT_DIR
+    return os.path.join(directory, digest[:2], f"{digest}.pdf")
+
+
+def store_artifact(data, directory=None):
+    """Write data under its SHA-256 and return the digest; identical content is stored once"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = artifact_path(digest, directory)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return digest
+
+
+_db = None
+
+
+def init_worker(mongo_url):
+    """Pool initializer: each worker process opens its own Mongo connection"""
+    global _db
+    _db = MongoClient(mongo_url).online_learning
+
+
+def render_certificate(user_id, course_id):
+    """Render one issued certificate, store the artifact and record its digest"""
+    key = {"user_id": user_id, "course_id": course_id}
+    try:
+        cert = _db.certificates.find_one(key)
+        user = _db.users.find_one({"username": user_id}, {"_id": 0, "name": 1}) or {}
+        course = _db.courses.find_one({"course_id": _course_id_value(course_id)}, {"_id": 0, "title": 1}) or {}
+        issued_on = cert["issued_on"]
+        if isinstance(issued_on, datetime.datetime):
+            issued_on = issued_on.date().isoformat()
+        data = render_pdf(user.get("name") or user_id, course.get("title") or f"Course {course_id}",
+                          str(issued_on)[:10], cert["_id"])
+        digest = store_artifact(data)
+    except Exception:
+        _db.certificates.update_one(key, {"$set": {"render_status": FAILED}, "$unset": {"render_claimed_at": ""}})
+        raise
+    _db.certificates.update_one(key, {"$set": {"render_status": DONE, "artifact": digest},
+                                      "$unset": {"render_claimed_at": ""}})
+    return digest
+
+
+def _course_id_value(course_id):
+    """courses stores integer course_ids; certificate requests carry them as strings"""
+    try:
+        return int(course_id)
+    except (TypeError, ValueError):
+        return course_id
@@ -0,0 +1,43 @@
+"""
+Certificate signatures: an HS256 JWT over the certificate's identifying fields,
+stored on the certificate and handed to learners. /verify checks it with the
+key set alone, so verification never touches the database.
+
+Keys come from CERTIFICATE_KEYSET_PATH (format in common/keys.py), falling back
+to CERTIFICATE_SECRET_KEY. They are deliberately separate from the login token keys,
+and there is no built-in default: without either setting the service refuses to start.
+"""
+import os
+
+import jwt
+
+from common.keys import DEFAULT_KID, KeySet
+
+ALGORITHM = "HS256"
+# Marks the token as a certificate, so it can never pass for any other kind of token
+TOKEN_TYPE = "certificate"
+SIGNED_FIELDS = ("user_id", "course_id", "issued_on")
+
+if not (os.environ.get("CERTIFICATE_KEYSET_PATH") or os.environ.get("CERTIFICATE_SECRET_KEY")):
+    raise RuntimeError("Set CERTIFICATE_KEYSET_PATH or CERTIFICATE_SECRET_KEY to sign certificates")
+
+_keys = KeySet(os.environ.get("CERTIFICATE_KEYSET_PATH"), os.environ.get("CERTIFICATE_SECRET_KEY"))
+
+
+def sign_certificate(cert):
+    kid, key = _keys.active()
+    payload = {field: str(cert[field]) for field in SIGNED_FIELDS}
+    payload["typ"] = TOKEN_TYPE
+    return jwt.encode(payload, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+
+def verify_certificate(signature):
+    """Return the signed fields if the signature is genuine; raises jwt.InvalidTokenError"""
+    kid = jwt.get_unverified_header(signature).get("kid", DEFAULT_KID)
+    key = _keys.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown key id {kid!r}")
+    claims = jwt.decode(signature, key, algorithms=[ALGORITHM])
+    if claims.get("typ") != TOKEN_TYPE or any(field not in claims for field in SIGNED_FIELDS):
+        raise jwt.InvalidTokenError("Not a certificate signature")
+    return {field: claims[field] for field in SIGNED_FIELDS}
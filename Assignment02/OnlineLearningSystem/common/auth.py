@@ -0,0 +1,68 @@
+"""
+Local verification of user_service-issued JWTs, so any service can authenticate a
+request from the token claims without calling user_service.
+
+Signing keys come from the key set file named by JWT_KEYSET_PATH:
+
+    {"active_kid": "2026-10", "keys": {"2026-10": "new secret", "2026-04": "old secret"}}
+
+New tokens are signed with the active key and carry its id in the `kid` header;
+any key still listed is accepted for verification. To rotate, add a key, make it
+active and drop the old one once the tokens it signed have expired. The file is
+re-read whenever it changes, so no restart is needed; if a change leaves it missing
+or malformed, the previous keys stay in use. Without a key set file a
+single key is taken from JWT_SECRET_KEY.
+"""
+import datetime
+import os
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+from common.keys import DEFAULT_KID, KeySet
+
+ALGORITHM = "HS256"
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+_keys = KeySet(os.environ.get("JWT_KEYSET_PATH"), os.environ.get("JWT_SECRET_KEY", "my_secret_key"))
+
+
+def issue_token(username, lifetime=TOKEN_LIFETIME, **claims):
+    kid, key = _keys.active()
+    payload = {**claims, "username": username, "exp": datetime.datetime.utcnow() + lifetime}
+    return jwt.encode(payload, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+
+def decode_token(token):
+    """Verify signature and expiry locally and return the claims; raises jwt.InvalidTokenError"""
+    kid = jwt.get_unverified_header(token).get("kid", DEFAULT_KID)
+    key = _keys.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown key id {kid!r}")
+    claims = jwt.decode(token, key, algorithms=[ALGORITHM], options={"require": ["exp"]})
+    if "username" not in claims:
+        raise jwt.InvalidTokenError("Token has no username claim")
+    return claims
+
+
+def bearer_token():
+    header = request.headers.get('Authorization')
+    if header and header.startswith("Bearer "):
+        return header.split(" ")[1]
+    return None
+
+
+def token_required(f):
+    """Reject requests without a valid token; the verified username is put in g.current_user"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = bearer_token()
+        if not token:
+            return jsonify({'message': 'Token is missing!'}), 401
+        try:
+            g.current_user = decode_token(token)['username']
+        except jwt.InvalidTokenError as e:
+            return jsonify({'message': f'Token is invalid: {str(e)}'}), 401
+        return f(*args, **kwargs)
+    return decorated
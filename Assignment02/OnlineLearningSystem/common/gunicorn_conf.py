@@ -0,0 +1,31 @@
+"""
+Production server settings shared by every service:
+
+    gunicorn -c common/gunicorn_conf.py app:app
+
+Everything is tunable through the environment. `kill -HUP <master pid>` reloads
+gracefully: new workers are started and old ones finish their in-flight requests.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# sync, gthread (threads per worker) or gevent (green threads)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# The apps create their MongoClient and HTTP sessions at import time. Importing in
+# each worker after the fork keeps connection pools from being shared across processes.
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
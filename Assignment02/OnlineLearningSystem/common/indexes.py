@@ -0,0 +1,72 @@
+"""
+Index declarations for every collection in the online_learning database.
+Each service calls ensure_indexes() at startup for the collections it queries.
+"""
+import logging
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    # register/login/token_required all look users up by username, register assumes it is unique
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True, name="username_unique"),
+    ],
+    # add_course rejects duplicate course_ids
+    "courses": [
+        IndexModel([("course_id", ASCENDING)], unique=True, name="course_id_unique"),
+        # Backs /courses/search; a collection can only have one text index
+        IndexModel([("title", TEXT), ("description", TEXT), ("instructor", TEXT)],
+                   weights={"title": 10, "instructor": 5, "description": 1}, name="course_text"),
+    ],
+    # The compound index also serves /my-courses, which filters on username alone
+    "enrollments": [
+        IndexModel([("username", ASCENDING), ("course_id", ASCENDING)], name="username_course_id"),
+        # Also walks a course's learners in username order for `flask issue-cohort`
+        IndexModel([("course_id", ASCENDING), ("username", ASCENDING)], name="course_id_username"),
+    ],
+    "course_enrollment_counts": [
+        IndexModel([("course_id", ASCENDING)], unique=True, name="course_id_unique"),
+        IndexModel([("count", DESCENDING)], name="count_desc"),
+    ],
+    # generate_certificate issues at most one certificate per (user_id, course_id)
+    "certificates": [
+        IndexModel([("user_id", ASCENDING), ("course_id", ASCENDING)], unique=True, name="user_id_course_id_unique"),
+        # flask render-pending picks up certificates whose artifact was never rendered
+        IndexModel([("render_status", ASCENDING)], name="render_status"),
+    ],
+    # get_feedback pages newest first within a course, optionally within a time window
+    "feedbacks": [
+        IndexModel([("course_id", ASCENDING), ("submitted_at", DESCENDING), ("_id", DESCENDING)],
+                   name="course_id_submitted_at"),
+    ],
+    # One running rating aggregate per course, kept by submit_feedback
+    "course_rating_stats": [
+        IndexModel([("course_id", ASCENDING)], unique=True, name="course_id_unique"),
+    ],
+}
+
+
+def ensure_indexes(db, *collection_names):
+    """Create the declared indexes for the given collections. Safe to call on every startup.
+
+    Writers rely on the unique indexes to reject duplicates, so failing to build one
+    (typically because duplicates already exist) raises and stops the service from starting.
+    A missing non-unique index only costs performance: it is logged and startup continues.
+    """
+    for name in collection_names:
+        try:
+            db[name].create_indexes(INDEXES[name])
+        except OperationFailure:
+            # Retry one by one to tell which index failed
+            for index in INDEXES[name]:
+                try:
+                    db[name].create_indexes([index])
+                except OperationFailure as e:
+                    if index.document.get("unique"):
+                        raise RuntimeError(
+                            f"Cannot create unique index {index.document['name']} on {name}: {e}. "
+                            "Remove the duplicate documents and restart.") from e
+                    logger.error("Could not create index %s on %s: %s", index.document["name"], name, e)
@@ -0,0 +1,47 @@
+"""
+Flask JSON provider backed by orjson. Serializes datetime natively and ObjectId,
+Decimal and Decimal128 through a small default hook, so Mongo documents can be
+returned from jsonify() as they are.
+
+    register_json_provider(app)
+"""
+import decimal
+
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def register_json_provider(app):
+    app.json = FastJSONProvider(app)
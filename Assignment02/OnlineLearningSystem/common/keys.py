@@ -0,0 +1,85 @@
+"""
+Rotatable HMAC key sets, read from a JSON file of the form
+
+    {"active_kid": "2026-10", "keys": {"2026-10": "new secret", "2026-04": "old secret"}}
+
+The active key signs; every listed key verifies. The file is re-read whenever
+its mtime changes. Without a file, a single fallback secret is used under DEFAULT_KID.
+
+The file must be valid when the process starts. A later change that leaves it missing
+or malformed (e.g. half-written during a rotation) is logged and the last good key set
+stays in use until the file is fixed.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Signatures made before key ids existed carry no kid
+DEFAULT_KID = "default"
+
+
+def load_key_set(path):
+    """(active_kid, keys) from the file at path; raises OSError or ValueError"""
+    with open(path) as f:
+        loaded = json.load(f)
+    keys = loaded.get("keys") if isinstance(loaded, dict) else None
+    if not isinstance(keys, dict) or not keys or not all(
+            isinstance(kid, str) and isinstance(secret, str) and secret for kid, secret in keys.items()):
+        raise ValueError("keys must map key ids to non-empty secrets")
+    if loaded.get("active_kid") not in keys:
+        raise ValueError(f"active_kid {loaded.get('active_kid')!r} is not in the key set")
+    return loaded["active_kid"], keys
+
+
+class KeySet:
+    def __init__(self, path, fallback_secret):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        # mtime of the last file that failed to load ("missing" if it was absent), so each
+        # broken version is read and logged once rather than on every lookup
+        self._failed = None
+        self._active_kid = DEFAULT_KID
+        self._keys = {DEFAULT_KID: fallback_secret}
+        if path:
+            self._mtime = os.stat(path).st_mtime
+            self._active_kid, self._keys = load_key_set(path)
+
+    def _reload(self):
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            if self._failed != "missing":
+                self._failed = "missing"
+                logger.error("Key set %s is unreadable, keeping the last good keys: %s", self.path, e)
+            return
+        if self._failed == "missing":
+            self._failed = None
+        if mtime not in (self._mtime, self._failed):
+            with self._lock:
+                if mtime not in (self._mtime, self._failed):
+                    try:
+                        active_kid, keys = load_key_set(self.path)
+                    except (OSError, ValueError) as e:
+                        self._failed = mtime
+                        logger.error("Key set %s is invalid, keeping the last good keys: %s", self.path, e)
+                        return
+                    self._active_kid, self._keys, self._mtime, self._failed = active_kid, keys, mtime, None
+
+    def active(self):
+        """(kid, secret) to sign with"""
+        self._reload()
+        kid = self._active_kid
+        return kid, self._keys[kid]
+
+    def get(self, kid):
+        """Secret for kid, or None if it has been retired or kid is not a key id at all"""
+        self._reload()
+        if not isinstance(kid, str):
+            return None
+        return self._keys.get(kid)
@@ -0,0 +1,54 @@
+"""
+Helpers for keyset pagination. The position of the last returned document is
+handed to the client as an opaque `next` token and sent back unchanged.
+fetch_page() runs one page of a sorted cursor and builds that token.
+"""
+import base64
+import binascii
+
+import orjson
+
+from common.json_provider import dumps_bytes
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(dumps_bytes(position)).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the position dict encoded in `token`; raises ValueError if it is malformed"""
+    try:
+        position = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError) as e:
+        raise ValueError("Invalid next token") from e
+    if not isinstance(position, dict):
+        raise ValueError("Invalid next token")
+    return position
+
+
+def parse_limit(args, default, maximum):
+    """Read ?limit= from request args; raises ValueError unless it is an integer in 1..maximum"""
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be an integer between 1 and {maximum}")
+    return limit
+
+
+def fetch_page(cursor, limit, position):
+    """(documents, next token) for one page of a sorted cursor.
+
+    One document more than `limit` is fetched, only to learn whether another page
+    exists. position(last document) returns the dict encoded as the next token, or
+    None when no further page may be requested.
+    """
+    documents = list(cursor.limit(limit + 1))
+    next_token = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_position = position(documents[-1])
+        if next_position is not None:
+            next_token = encode_cursor(next_position)
+    return documents, next_token
@@ -0,0 +1,198 @@
+"""
+HTTP client for calls between services. Each downstream gets its own:
+
+- circuit breaker: after `failure_threshold` consecutive failures the circuit opens and
+  calls fail immediately; after `reset_timeout` seconds one trial call is let through
+  (half-open) and its outcome closes or re-opens the circuit
+- bulkhead: at most `max_concurrent` calls in flight, extra callers are rejected at once
+- timeouts on connect and read
+- retry budget: retries are only spent while they stay under `retry_ratio` of recent calls
+
+Rejections raise subclasses of requests.exceptions.RequestException, so callers that
+already handle request failures need no changes.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+class BulkheadFullError(requests.exceptions.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class RetryBudget:
+    """Token bucket: every call deposits `ratio` tokens, every retry withdraws one"""
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class ResilientClient:
+    def __init__(self, name, base_url, connect_timeout=1.0, read_timeout=3.0, max_concurrent=20,
+                 failure_threshold=5, reset_timeout=10.0, max_retries=1, retry_ratio=0.2):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retry_budget = RetryBudget(retry_ratio)
+        self.in_flight = 0
+        self.rejected = {"circuit_open": 0, "bulkhead_full": 0}
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        # One pooled connection per concurrent slot; retries are handled here, not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        _clients[name] = self
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, idempotent=False, **kwargs):
+        return self.request("POST", path, idempotent=idempotent, **kwargs)
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(method, path, **kwargs)
+            except (CircuitOpenError, BulkheadFullError):
+                raise
+            except requests.exceptions.RequestException:
+                attempt += 1
+                if not idempotent or attempt > self.max_retries or not self.retry_budget.withdraw():
+                    raise
+
+    def admit(self):
+        """Breaker check for a call made outside request(), e.g. over another HTTP library.
+        The caller reports the outcome through self.breaker."""
+        if self.breaker.allow():
+            return True
+        self._reject("circuit_open")
+        return False
+
+    def _attempt(self, method, path, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            self._reject("bulkhead_full")
+            raise BulkheadFullError(f"{self.name} has {self.max_concurrent} calls in flight")
+        # Take the slot first: a half-open trial that is granted must always get to run
+        if not self.breaker.allow():
+            self._slots.release()
+            self._reject("circuit_open")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            response.raise_for_status()
+        self.breaker.record_success()
+        return response
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+
+    def metrics(self):
+        breaker = self.breaker
+        return {
+            "state": breaker.state,
+            "consecutive_failures": breaker.consecutive_failures,
+            "times_opened": breaker.times_opened,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": dict(self.rejected),
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+        }
+
+
+_clients = {}
+
+
+def breaker_metrics():
+    """State of every client created in this process, keyed by downstream name"""
+    return {name: client.metrics() for name, client in _clients.items()}
@@ -0,0 +1,30 @@
+"""
+Stream Mongo cursors as HTTP responses without materializing the result set.
+Memory stays bounded by the cursor batch size whatever the collection size.
+"""
+from flask import Response, stream_with_context
+
+from common.json_provider import dumps_bytes
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _ndjson(cursor):
+    for document in cursor:
+        yield dumps_bytes(document) + b"\n"
+
+
+def _json_array(cursor):
+    yield b"["
+    first = True
+    for document in cursor:
+        yield dumps_bytes(document) if first else b"," + dumps_bytes(document)
+        first = False
+    yield b"]"
+
+
+def stream_cursor(cursor, fmt="json"):
+    """Chunked response for `cursor`: a JSON array, or one document per line for fmt="ndjson" """
+    if fmt == "ndjson":
+        return Response(stream_with_context(_ndjson(cursor)), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(_json_array(cursor)), mimetype="application/json")
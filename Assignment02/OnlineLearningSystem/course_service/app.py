@@ -1,8 +1,19 @@
 from flask import Flask, request, jsonify
+import os
+import hashlib
+import itertools
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import orjson
 from flasgger import Swagger, swag_from
+from common.indexes import ensure_indexes
+from common.json_provider import dumps_bytes, register_json_provider
+from common.pagination import decode_cursor, fetch_page, parse_limit
+from common.streaming import stream_cursor
+from common.cache import TTLCache
 
 app = Flask(__name__)
+register_json_provider(app)
 
 # http://localhost:5002/apidocs/#/
 
@@ -24,9 +35,51 @@ swagger_config = {
 
 swagger = Swagger(app, config=swagger_config)
 
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 courses_collection = db.courses
+ensure_indexes(db, "courses")
+
+# Upper bound on ids accepted by /courses/batch in a single request
+MAX_BATCH_SIZE = 500
+# Fields a /courses/batch caller may ask for; _id is never returned
+COURSE_FIELDS = {"course_id", "title", "description", "instructor"}
+
+# Page size for GET /courses?limit=..., and documents per Mongo batch when streaming
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+
+# POST /courses/import: documents per insert_many, and how many line errors are listed
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 1000
+
+# /courses/search pages by offset, since results are ordered by relevance
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_OFFSET = 1000
+
+# course_id -> (course, etag) for GET /course/<id>. Each worker process has its own
+# cache, so the TTL bounds how long another worker can serve a changed course.
+COURSE_CACHE_SIZE = 10000
+COURSE_CACHE_TTL = 30
+course_cache = TTLCache(maxsize=COURSE_CACHE_SIZE, ttl=COURSE_CACHE_TTL)
+# course_id -> stamp of its last invalidation in this process. get_course only caches what it
+# read if no update or delete invalidated the course while the read was in flight.
+course_invalidations = {}
+_invalidation_stamps = itertools.count(1)
+
+
+def invalidate_course(course_id):
+    course_invalidations[course_id] = next(_invalidation_stamps)
+    course_cache.pop(course_id)
+
+
+def course_etag(course):
+    # Hash of the exact response body: unlike a write counter, it never repeats for different
+    # content, even after a course is deleted and added again
+    return hashlib.sha256(dumps_bytes(course)).hexdigest()[:32]
 
 
 @app.route('/')
@@ -68,21 +121,112 @@ def welcome():
 })
 def add_course():
     data = request.json
-    existing_course = courses_collection.find_one({"course_id": data.get("course_id")})
-    
-    if existing_course:
+    # The unique course_id index rejects duplicates, no need to look first
+    try:
+        courses_collection.insert_one(data)
+    except DuplicateKeyError:
         return jsonify({"error": "Course with this course_id already exists"}), 400
-
-    courses_collection.insert_one(data)
     return jsonify({"message": "Course added"})
 
 
+def parse_import_line(line):
+    """Return (course, None) for a valid NDJSON line or (None, error message)"""
+    try:
+        course = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        return None, f"Invalid JSON: {e}"
+    if not isinstance(course, dict):
+        return None, "Expected a JSON object"
+    if not isinstance(course.get("course_id"), int) or isinstance(course.get("course_id"), bool):
+        return None, "course_id must be an integer"
+    if not isinstance(course.get("title"), str):
+        return None, "title is required"
+    course.pop("_id", None)
+    return course, None
+
+
+@app.route('/courses/import', methods=['POST'])
+@swag_from({
+    'tags': ['Courses'],
+    'summary': 'Bulk import courses from an NDJSON body',
+    'description': 'One course object per line. The body is read incrementally and written '
+                   'in unordered batches, so uploads of any size use bounded memory. Lines '
+                   'that fail validation or duplicate an existing course_id are reported '
+                   'and skipped; the rest are imported.',
+    'consumes': ['application/x-ndjson'],
+    'parameters': [
+        {'name': 'batch_size', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': f'Courses per insert (default {DEFAULT_IMPORT_BATCH_SIZE}, max {MAX_IMPORT_BATCH_SIZE})'}
+    ],
+    'responses': {
+        200: {'description': 'Counts of inserted and failed lines plus per-line errors'},
+        400: {'description': 'Invalid batch_size'}
+    }
+})
+def import_courses():
+    try:
+        batch_size = int(request.args.get('batch_size', DEFAULT_IMPORT_BATCH_SIZE))
+    except ValueError:
+        batch_size = 0
+    if not 1 <= batch_size <= MAX_IMPORT_BATCH_SIZE:
+        return jsonify({"error": f"batch_size must be an integer between 1 and {MAX_IMPORT_BATCH_SIZE}"}), 400
+
+    report = {"inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def record_error(line_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "error": message})
+        else:
+            report["errors_truncated"] = True
+
+    def flush(batch, line_numbers):
+        try:
+            report["inserted"] += len(courses_collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            report["inserted"] += e.details["nInserted"]
+            for write_error in e.details["writeErrors"]:
+                message = "Duplicate course_id" if write_error["code"] == 11000 else write_error["errmsg"]
+                record_error(line_numbers[write_error["index"]], message)
+
+    batch, line_numbers = [], []
+    for line_number, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+        course, error = parse_import_line(line)
+        if error:
+            record_error(line_number, error)
+            continue
+        batch.append(course)
+        line_numbers.append(line_number)
+        if len(batch) >= batch_size:
+            flush(batch, line_numbers)
+            batch, line_numbers = [], []
+    if batch:
+        flush(batch, line_numbers)
+
+    # Insert errors surface per batch, after validation errors of later lines
+    report["errors"].sort(key=lambda error: error["line"])
+    return jsonify(report)
+
+
 @app.route('/courses', methods=['GET'])
 @swag_from({
     'tags': ['Courses'],
+    'description': 'Without limit/next the whole catalog is streamed, as a chunked JSON array '
+                   'or as NDJSON with format=ndjson. With limit or next, one page ordered by '
+                   'course_id is returned together with the token for the following page.',
+    'parameters': [
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': f'Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE})'},
+        {'name': 'next', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Opaque token from the previous page'},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'required': False,
+         'enum': ['json', 'ndjson'], 'description': 'Streaming format when not paginating'}
+    ],
     'responses': {
         200: {
-            'description': 'List of courses',
+            'description': 'List of courses, or {"courses": [...], "next": token} when paginating',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -95,12 +239,70 @@ def add_course():
                     }
                 }
             }
-        }
+        },
+        400: {'description': 'Invalid limit or next token'}
     }
 })
 def list_courses():
-    courses = list(courses_collection.find({}, {'_id': 0}))
-    return jsonify(courses)
+    if 'limit' not in request.args and 'next' not in request.args:
+        cursor = courses_collection.find({}, {'_id': 0}).sort('course_id', 1).batch_size(STREAM_BATCH_SIZE)
+        return stream_cursor(cursor, request.args.get('format', 'json'))
+
+    try:
+        limit = parse_limit(request.args, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query = {}
+        if request.args.get('next'):
+            query = {"course_id": {"$gt": decode_cursor(request.args['next'])["after"]}}
+    except KeyError:
+        return jsonify({"error": "Invalid next token"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    courses, next_token = fetch_page(courses_collection.find(query, {'_id': 0}).sort('course_id', 1), limit,
+                                     lambda last: {"after": last["course_id"]})
+    return jsonify({"courses": courses, "next": next_token})
+
+@app.route('/courses/search', methods=['GET'])
+@swag_from({
+    'tags': ['Courses'],
+    'summary': 'Full-text search over course title, instructor and description',
+    'parameters': [
+        {'name': 'q', 'in': 'query', 'type': 'string', 'required': True,
+         'description': 'Search terms; "quoted phrases" and -excluded words are supported'},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': f'Page size (default {DEFAULT_SEARCH_LIMIT}, max {MAX_SEARCH_LIMIT})'},
+        {'name': 'next', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Opaque token from the previous page'}
+    ],
+    'responses': {
+        200: {'description': '{"courses": [...], "next": token}, best matches first, each with a score'},
+        400: {'description': 'Missing q, invalid limit or next token'}
+    }
+})
+def search_courses():
+    terms = request.args.get('q', '').strip()
+    if not terms:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = parse_limit(request.args, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        offset = int(decode_cursor(request.args['next'])["offset"]) if request.args.get('next') else 0
+        # Tokens are client-supplied; only offsets this endpoint could have issued are accepted
+        if not 0 <= offset < MAX_SEARCH_OFFSET:
+            raise ValueError("Invalid next token")
+    except (KeyError, TypeError):
+        return jsonify({"error": "Invalid next token"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    score = {"$meta": "textScore"}
+    cursor = (courses_collection.find({"$text": {"$search": terms}}, {'_id': 0, 'score': score})
+              .sort([("score", score), ("course_id", 1)])
+              .skip(offset))
+    next_offset = offset + limit
+    courses, next_token = fetch_page(cursor, limit,
+                                     lambda last: {"offset": next_offset} if next_offset < MAX_SEARCH_OFFSET else None)
+    return jsonify({"courses": courses, "next": next_token})
+
 
 @app.route('/course/<int:course_id>', methods=['GET'])
 @swag_from({
@@ -114,16 +316,93 @@ def list_courses():
         }
     ],
     'responses': {
-        200: {'description': 'Course found'},
+        200: {'description': 'Course found, with a strong ETag'},
+        304: {'description': 'If-None-Match matches the current ETag'},
         404: {'description': 'Course not found'}
     }
 })
 def get_course(course_id):
-    course = courses_collection.find_one({"course_id": course_id}, {"_id": 0})
-    if course:
-        return jsonify(course)
+    cached = course_cache.get(course_id)
+    if cached is None:
+        stamp = course_invalidations.get(course_id)
+        course = courses_collection.find_one({"course_id": course_id}, {"_id": 0})
+        if not course:
+            return jsonify({"error": "Course not found"}), 404
+        cached = (course, course_etag(course))
+        course_cache.set(course_id, cached)
+        # Checked after the set, so an invalidation racing with it cannot leave this entry behind
+        if course_invalidations.get(course_id) != stamp:
+            course_cache.pop(course_id)
+
+    course, etag = cached
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
     else:
-        return jsonify({"error": "Course not found"}), 404
+        response = jsonify(course)
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/courses/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Courses'],
+    'summary': 'Get many courses in one call',
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'course_ids': {'type': 'array', 'items': {'type': 'integer'}},
+                    'fields': {'type': 'array', 'items': {'type': 'string'}}
+                },
+                'required': ['course_ids']
+            }
+        }
+    ],
+    'responses': {
+        200: {'description': 'Matching courses plus the ids that were not found'},
+        400: {'description': 'course_ids missing, not a list or too long, or fields not course fields'}
+    }
+})
+def get_courses_batch():
+    data = request.get_json(silent=True) or {}
+    course_ids = data.get('course_ids')
+    if not isinstance(course_ids, list):
+        return jsonify({"error": "course_ids must be a list"}), 400
+    if len(course_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} course_ids per request"}), 400
+
+    # Path lookups go through <int:course_id>, so ids that are not integers can never match.
+    # They (and null, objects, ...) are reported in missing rather than failing the batch,
+    # so one bad enrollment does not cost the caller every other title.
+    wanted = {}
+    unmatchable = []
+    for raw_id in course_ids:
+        if isinstance(raw_id, (int, str)) and not isinstance(raw_id, bool):
+            try:
+                wanted[raw_id] = int(raw_id)
+                continue
+            except ValueError:
+                pass
+        unmatchable.append(raw_id)
+
+    projection = {'_id': 0}
+    fields = data.get('fields')
+    if fields:
+        if not isinstance(fields, list) or not all(isinstance(field, str) and field in COURSE_FIELDS
+                                                   for field in fields):
+            return jsonify({"error": f"fields must be a list of: {', '.join(sorted(COURSE_FIELDS))}"}), 400
+        projection = {field: 1 for field in fields}
+        projection.update({'_id': 0, 'course_id': 1})
+
+    lookup_ids = list(set(wanted.values()))
+    courses = list(courses_collection.find({"course_id": {"$in": lookup_ids}}, projection))
+    found = {course['course_id'] for course in courses}
+    missing = [raw_id for raw_id, cid in wanted.items() if cid not in found] + unmatchable
+    return jsonify({"courses": courses, "missing": missing})
 
 
 @app.route('/course/<int:course_id>', methods=['PUT'])
@@ -158,6 +437,7 @@ def get_course(course_id):
 def update_course(course_id):
     data = request.json
     result = courses_collection.update_one({"course_id": course_id}, {"$set": data})
+    invalidate_course(course_id)
     if result.matched_count > 0:
         return jsonify({"message": "Course updated"})
     else:
@@ -181,10 +461,22 @@ def update_course(course_id):
 })
 def delete_course(course_id):
     result = courses_collection.delete_one({"course_id": course_id})
+    invalidate_course(course_id)
     if result.deleted_count > 0:
         return jsonify({"message": "Course deleted"})
     else:
         return jsonify({"error": "Course not found"}), 404
 
+@app.route('/stats/cache', methods=['GET'])
+@swag_from({
+    'tags': ['Courses'],
+    'summary': 'Course cache size and hit ratio for this worker',
+    'responses': {
+        200: {'description': 'Course cache statistics'}
+    }
+})
+def course_cache_stats():
+    return jsonify(course_cache.stats())
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5002)))
\ No newline at end of file
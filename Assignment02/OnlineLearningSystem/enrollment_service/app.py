@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
+from flask import Flask, request, jsonify, g
+import os
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 from flasgger import Swagger, swag_from
+from common.indexes import ensure_indexes
+from common.json_provider import register_json_provider
+from common.auth import token_required
+from common.resilience import ResilientClient, breaker_metrics
+import async_client
 
 app = Flask(__name__)
+register_json_provider(app)
 
 # Swagger configuration
 swagger_config = {
@@ -26,29 +32,77 @@ swagger_config = {
 
 swagger = Swagger(app, config=swagger_config)
 
-# Retry session setup
-def get_retry_session():
-    session = requests.Session()
-    retry = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504]
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    return session
-
-session = get_retry_session()
+# Breaker, bulkhead and timeouts for calls to course-service and user-service
+course_service = ResilientClient("course-service", "http://course-service:5002")
+user_service = ResilientClient("user-service", "http://user-service:5001")
 
 # MongoDB setup
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 enrollments_collection = db.enrollments
+# Per-course enrollment counters read by analytics_service
+enrollment_counts_collection = db.course_enrollment_counts
+ensure_indexes(db, "enrollments", "course_enrollment_counts")
+
+# Must not exceed MAX_BATCH_SIZE in course_service
+COURSE_BATCH_SIZE = 500
+# Must not exceed MAX_BATCH_SIZE in user_service
+USER_BATCH_SIZE = 5000
+# Role a caller needs to enroll other users through /enroll/bulk; only user_service's
+# `flask set-role <username> admin` grants it
+BULK_ENROLL_ROLE = "admin"
+
+# POST /enroll/bulk: rows per request, and usernames / enrollments per Mongo round trip
+MAX_BULK_ENROLLMENTS = 50000
+BULK_BATCH_SIZE = 1000
+
+# ENROLLMENT_ASYNC_MODE=1 looks courses up concurrently through async_client
+# instead of the batched blocking calls
+ASYNC_MODE = os.environ.get("ENROLLMENT_ASYNC_MODE", "0") == "1"
+
+def adjust_enrollment_counts(deltas):
+    # Each $inc is atomic on its own; both sides of a move go out in one round trip
+    enrollment_counts_collection.bulk_write([
+        UpdateOne({"course_id": course_id}, {"$inc": {"count": delta}}, upsert=True)
+        for course_id, delta in deltas.items()
+    ])
+
+def fetch_course_titles_batched(course_ids):
+    # One batched call per COURSE_BATCH_SIZE ids instead of one call per enrollment
+    titles = {}
+    for start in range(0, len(course_ids), COURSE_BATCH_SIZE):
+        chunk = course_ids[start:start + COURSE_BATCH_SIZE]
+        try:
+            response = course_service.post(
+                '/courses/batch',
+                json={"course_ids": chunk, "fields": ["title"]},
+                idempotent=True
+            )
+            if response.status_code == 200:
+                for course in response.json().get("courses", []):
+                    titles[str(course["course_id"])] = course.get("title", "Unknown")
+                for course_id in chunk:
+                    titles.setdefault(str(course_id), "Not Found")
+            else:
+                for course_id in chunk:
+                    titles[str(course_id)] = "Error Fetching Title"
+        except requests.exceptions.RequestException:
+            for course_id in chunk:
+                titles[str(course_id)] = "Error Fetching Title"
+    return titles
 
 @app.route('/enroll', methods=['POST'])
+@token_required
 @swag_from({
     'tags': ['Enrollment'],
-    'summary': 'Enroll a user in a course',
+    'summary': 'Enroll the authenticated user in a course',
+    'parameters': [{
+        'name': 'Authorization',
+        'in': 'header',
+        'required': True,
+        'schema': {'type': 'string'},
+        'description': 'Bearer token issued by user-service /login'
+    }],
     'requestBody': {
         'required': True,
         'content': {
@@ -69,25 +123,171 @@ enrollments_collection = db.enrollments
                 }
             }
         },
-        404: {
-            'description': 'User not found'
+        401: {
+            'description': 'Token missing or invalid'
+        },
+        403: {
+            'description': 'username in the body does not match the token'
         }
     }
 })
 def enroll():
     data = request.json
-    username = data.get('username')
+    # The token was verified locally, so its username needs no round trip to user-service
+    username = data.get('username', g.current_user)
     course_id = data.get('course_id')
 
-    user_response = session.get(f'http://user-service:5001/get_user/{username}')
-
-    if user_response.status_code != 200:
-        return jsonify({"message": "User does not exist"}), 404
+    if username != g.current_user:
+        return jsonify({"message": "Cannot enroll another user"}), 403
 
     enrollment = {"username": username, "course_id": course_id}
     enrollments_collection.insert_one(enrollment)
+    adjust_enrollment_counts({course_id: 1})
     return jsonify({"message": "Enrolled successfully"})
 
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def fetch_users(usernames):
+    """username -> {username, role} for the usernames user-service knows; raises RequestException"""
+    users = {}
+    for batch in chunks(usernames, USER_BATCH_SIZE):
+        # Forward the caller's token: /users/batch is authenticated too
+        response = user_service.post(
+            '/users/batch',
+            json={"usernames": batch, "fields": ["role"]},
+            headers={"Authorization": request.headers["Authorization"]},
+            idempotent=True
+        )
+        response.raise_for_status()
+        users.update((user["username"], user) for user in response.json()["users"])
+    return users
+
+@app.route('/enroll/bulk', methods=['POST'])
+@token_required
+@swag_from({
+    'tags': ['Enrollment'],
+    'summary': 'Enroll many users at once, e.g. when onboarding a cohort',
+    'parameters': [{
+        'name': 'Authorization',
+        'in': 'header',
+        'required': True,
+        'schema': {'type': 'string'},
+        'description': 'Bearer token issued by user-service /login'
+    }],
+    'requestBody': {
+        'required': True,
+        'content': {
+            'application/json': {
+                'example': {
+                    'enrollments': [
+                        {'username': 'john_doe', 'course_id': 1},
+                        {'username': 'jane_doe', 'course_id': 1}
+                    ]
+                }
+            }
+        }
+    },
+    'responses': {
+        200: {
+            'description': 'Outcome per input row: enrolled, already_enrolled, duplicate_in_request, '
+                           'user_not_found, invalid or failed',
+            'content': {
+                'application/json': {
+                    'example': {
+                        'summary': {'enrolled': 1, 'user_not_found': 1},
+                        'results': [
+                            {'index': 0, 'username': 'john_doe', 'course_id': 1, 'status': 'enrolled'},
+                            {'index': 1, 'username': 'jane_doe', 'course_id': 1, 'status': 'user_not_found'}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {'description': 'enrollments missing, not a list or too long'},
+        401: {'description': 'Token missing or invalid'},
+        403: {'description': f'The caller does not have the {BULK_ENROLL_ROLE} role'},
+        503: {'description': 'user-service unavailable'}
+    }
+})
+def bulk_enroll():
+    data = request.get_json(silent=True) or {}
+    rows = data.get('enrollments')
+    if not isinstance(rows, list):
+        return jsonify({"error": "enrollments must be a list"}), 400
+    if len(rows) > MAX_BULK_ENROLLMENTS:
+        return jsonify({"error": f"At most {MAX_BULK_ENROLLMENTS} enrollments per request"}), 400
+
+    # Enrolling other users is an administrative action, unlike /enroll
+    try:
+        caller = fetch_users([g.current_user]).get(g.current_user, {})
+    except requests.exceptions.RequestException:
+        return jsonify({"error": "user-service unavailable"}), 503
+    if caller.get('role') != BULK_ENROLL_ROLE:
+        return jsonify({"error": f"Bulk enrollment requires the {BULK_ENROLL_ROLE} role"}), 403
+
+    results = []
+    pairs = {}  # (username, course_id) -> result of its first occurrence
+    for index, row in enumerate(rows):
+        username = row.get('username') if isinstance(row, dict) else None
+        course_id = row.get('course_id') if isinstance(row, dict) else None
+        result = {"index": index, "username": username, "course_id": course_id}
+        results.append(result)
+        if not isinstance(username, str) or not isinstance(course_id, (int, str)) or isinstance(course_id, bool):
+            result["status"] = "invalid"
+        elif (username, course_id) in pairs:
+            result["status"] = "duplicate_in_request"
+        else:
+            pairs[(username, course_id)] = result
+
+    # One /users/batch call per USER_BATCH_SIZE distinct usernames
+    try:
+        known_users = set(fetch_users(list({username for username, _ in pairs})))
+    except requests.exceptions.RequestException:
+        return jsonify({"error": "user-service unavailable"}), 503
+
+    # Existing enrollments of these users, fetched through the (username, course_id) index
+    candidates = [pair for pair in pairs if pair[0] in known_users]
+    existing = set()
+    for batch in chunks(candidates, BULK_BATCH_SIZE):
+        query = {"username": {"$in": list({u for u, _ in batch})}, "course_id": {"$in": list({c for _, c in batch})}}
+        existing.update((e["username"], e["course_id"]) for e in
+                        enrollments_collection.find(query, {"_id": 0, "username": 1, "course_id": 1}))
+
+    to_insert = []
+    for pair, result in pairs.items():
+        if pair[0] not in known_users:
+            result["status"] = "user_not_found"
+        elif pair in existing:
+            result["status"] = "already_enrolled"
+        else:
+            to_insert.append(pair)
+
+    deltas = {}
+    for batch in chunks(to_insert, BULK_BATCH_SIZE):
+        failed = set()
+        try:
+            enrollments_collection.insert_many(
+                [{"username": username, "course_id": course_id} for username, course_id in batch],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details["writeErrors"]}
+        for position, pair in enumerate(batch):
+            if position in failed:
+                pairs[pair]["status"] = "failed"
+            else:
+                pairs[pair]["status"] = "enrolled"
+                deltas[pair[1]] = deltas.get(pair[1], 0) + 1
+    if deltas:
+        adjust_enrollment_counts(deltas)
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return jsonify({"summary": summary, "results": results})
+
 @app.route('/my-courses/<username>', methods=['GET'])
 @swag_from({
     'tags': ['Enrollment'],
@@ -119,32 +319,23 @@ def enroll():
 })
 def get_user_courses(username):
     enrolled = list(enrollments_collection.find({"username": username}, {"_id": 0}))
-    enriched_courses = []
+    # Titles are keyed by the id's string form, which also keeps a malformed stored id (null,
+    # an object) hashable; course-service reports such ids as missing, i.e. "Not Found"
+    course_ids = list(dict.fromkeys(str(record['course_id']) for record in enrolled))
 
-    for record in enrolled:
-        course_id = record['course_id']
-        try:
-            response = session.get(f'http://course-service:5002/course/{course_id}')
-            if response.status_code == 200:
-                course_info = response.json()
-                enriched_courses.append({
-                    "username": username,
-                    "course_id": course_id,
-                    "course_title": course_info.get("title", "Unknown")
-                })
-            else:
-                enriched_courses.append({
-                    "username": username,
-                    "course_id": course_id,
-                    "course_title": "Not Found"
-                })
-        except requests.exceptions.RequestException:
-            enriched_courses.append({
-                "username": username,
-                "course_id": course_id,
-                "course_title": "Error Fetching Title"
-            })
+    if ASYNC_MODE:
+        titles = async_client.fetch_course_titles(course_ids, course_service)
+    else:
+        titles = fetch_course_titles_batched(course_ids)
 
+    enriched_courses = [
+        {
+            "username": username,
+            "course_id": record['course_id'],
+            "course_title": titles[str(record['course_id'])]
+        }
+        for record in enrolled
+    ]
     return jsonify(enriched_courses)
 
 @app.route('/enroll', methods=['PUT'])
@@ -191,6 +382,9 @@ def update_enrollment():
     if result.matched_count == 0:
         return jsonify({"error": "Enrollment not found"}), 404
 
+    if old_course_id != new_course_id:
+        adjust_enrollment_counts({old_course_id: -1, new_course_id: 1})
+
     return jsonify({"message": "Enrollment updated"})
 
 @app.route('/enroll', methods=['DELETE'])
@@ -232,8 +426,20 @@ def delete_enrollment():
     if result.deleted_count == 0:
         return jsonify({"error": "Enrollment not found"}), 404
 
+    adjust_enrollment_counts({course_id: -1})
     return jsonify({"message": "Enrollment deleted"})
 
+@app.route('/metrics/circuit_breakers', methods=['GET'])
+@swag_from({
+    'tags': ['Metrics'],
+    'summary': 'Circuit breaker and bulkhead state per downstream service',
+    'responses': {
+        200: {'description': 'Breaker state, in-flight calls and rejection counts'}
+    }
+})
+def circuit_breaker_metrics():
+    return jsonify(breaker_metrics())
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5003)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5003)))
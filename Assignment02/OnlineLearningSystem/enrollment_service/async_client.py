@@ -0,0 +1,127 @@
+"""
+Concurrent course lookups for enrollment_service.
+
+Flask views run in worker threads, so the coroutines run on one background event
+loop per process. That loop owns a single aiohttp session, which lets every request
+share the same keep-alive connection pool. Views block on the result with a deadline.
+
+Each fan-out goes through the circuit breaker of the caller's ResilientClient: with the
+circuit open no call is made, and a fan-out in which course-service answered a 5xx or a
+connection failed counts as one failure, so async and blocking lookups trip (and report in
+breaker_metrics) together. Lookups that only miss the deadline do not count: one slow
+course must not open the circuit for every user.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import threading
+
+import aiohttp
+
+# Whole fan-out budget for one request, in seconds
+FANOUT_DEADLINE = float(os.environ.get("ENROLLMENT_FANOUT_DEADLINE", "2.0"))
+# Upper bound on open connections to course-service per process
+MAX_CONNECTIONS = int(os.environ.get("ENROLLMENT_MAX_CONNECTIONS", "100"))
+
+ERROR_TITLE = "Error Fetching Title"
+NOT_FOUND_TITLE = "Not Found"
+
+_loop = None
+_session = None
+_start_lock = threading.Lock()
+
+
+def _ensure_loop():
+    """Start the background loop lazily, so it is created in the process that serves requests"""
+    global _loop, _session
+    with _start_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="enrollment-async-io", daemon=True).start()
+
+            async def open_session():
+                connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=30)
+                return aiohttp.ClientSession(connector=connector)
+
+            _session = asyncio.run_coroutine_threadsafe(open_session(), loop).result()
+            _loop = loop
+            atexit.register(close)
+    return _loop
+
+
+def close():
+    """Close pooled connections and stop the background loop"""
+    global _loop, _session
+    with _start_lock:
+        if _loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(_session.close(), _loop).result(timeout=5)
+        _loop.call_soon_threadsafe(_loop.stop)
+        _loop, _session = None, None
+
+
+async def _fetch_title(base_url, course_id):
+    async with _session.get(f"{base_url}/course/{course_id}") as response:
+        if response.status == 200:
+            course = await response.json()
+            return course.get("title", "Unknown")
+        if response.status == 404:
+            return NOT_FOUND_TITLE
+        # A 5xx is a course-service failure; anything else is only this lookup's problem
+        if response.status >= 500:
+            response.raise_for_status()
+        return ERROR_TITLE
+
+
+def _is_service_failure(error):
+    """Whether a lookup error says course-service itself is unhealthy"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, aiohttp.ClientConnectionError)
+
+
+async def _fetch_titles(base_url, course_ids, deadline):
+    """(titles, whether any lookup hit a course-service failure)"""
+    tasks = {course_id: asyncio.ensure_future(_fetch_title(base_url, course_id)) for course_id in course_ids}
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    titles, failed = {}, False
+    for course_id, task in tasks.items():
+        if task in pending or task.cancelled():
+            titles[course_id] = ERROR_TITLE
+        elif task.exception() is not None:
+            titles[course_id] = ERROR_TITLE
+            failed = failed or _is_service_failure(task.exception())
+        else:
+            titles[course_id] = task.result()
+    return titles, failed
+
+
+def fetch_course_titles(course_ids, client, deadline=FANOUT_DEADLINE):
+    """Look up every course concurrently at client.base_url; ids not answered within
+    `deadline`, or all of them while client's circuit is open, map to ERROR_TITLE"""
+    course_ids = list(course_ids)
+    if not course_ids:
+        return {}
+    if not client.admit():
+        return dict.fromkeys(course_ids, ERROR_TITLE)
+
+    loop = _ensure_loop()
+    future = asyncio.run_coroutine_threadsafe(_fetch_titles(client.base_url, course_ids, deadline), loop)
+    try:
+        # _fetch_titles enforces the deadline itself; the margin only covers scheduling
+        titles, failed = future.result(timeout=deadline + 1)
+    except concurrent.futures.TimeoutError:
+        # The loop is too busy to finish in time, which says nothing about course-service;
+        # degrade instead of failing the request
+        future.cancel()
+        titles, failed = dict.fromkeys(course_ids, ERROR_TITLE), False
+    # Always record an outcome: a half-open trial granted by admit() must be resolved
+    if failed:
+        client.breaker.record_failure()
+    else:
+        client.breaker.record_success()
+    return titles
@@ -1,32 +1,76 @@
 from flask import Flask, request, jsonify
-from pymongo import MongoClient
+import os
+import re
+import math
+from pymongo import MongoClient, DeleteMany, ReplaceOne, UpdateOne, DESCENDING
+from bson import ObjectId
+from bson.errors import InvalidId
 import datetime
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+import click
 from flasgger import Swagger, swag_from
+from common.indexes import ensure_indexes
+from common.json_provider import register_json_provider
+from common.pagination import decode_cursor, fetch_page, parse_limit
+from common.streaming import stream_cursor
+from common.resilience import ResilientClient, breaker_metrics
+from write_behind import BufferFull, WriteBehindBuffer
 
 app = Flask(__name__)
+register_json_provider(app)
 swagger = Swagger(app)
 
-# Retry-enabled HTTP session (for future use)
-def get_retry_session():
-    session = requests.Session()
-    retry = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504]
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    return session
-
-session = get_retry_session()
+# Breaker, bulkhead and timeouts for calls to user-service (for future use)
+user_service = ResilientClient("user-service", "http://user-service:5001")
 
 # Connect to MongoDB
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 feedback_collection = db.feedbacks
+rating_stats_collection = db.course_rating_stats
+ensure_indexes(db, "feedbacks", "course_rating_stats")
+
+# Comments per /feedback/<course_id> page, by default and at most, and per Mongo batch when streaming
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+# Newest first; _id breaks ties between feedback submitted in the same millisecond
+FEEDBACK_ORDER = [("submitted_at", DESCENDING), ("_id", DESCENDING)]
+
+MIN_RATING, MAX_RATING = 1, 5
+HISTOGRAM_BUCKETS = [str(star) for star in range(MIN_RATING, MAX_RATING + 1)]
+
+def rating_bucket(rating):
+    """Histogram star for a rating; halves round up"""
+    return str(math.floor(rating + 0.5))
+
+def apply_rating_increments(feedbacks):
+    """Fold new feedback into course_rating_stats with one $inc upsert per course"""
+    increments = {}
+    for feedback in feedbacks:
+        rating = feedback["rating"]
+        inc = increments.setdefault(feedback["course_id"], {"count": 0, "sum": 0, "sum_squares": 0})
+        inc["count"] += 1
+        inc["sum"] += rating
+        inc["sum_squares"] += rating * rating
+        bucket = f"histogram.{rating_bucket(rating)}"
+        inc[bucket] = inc.get(bucket, 0) + 1
+    rating_stats_collection.bulk_write([
+        UpdateOne({"course_id": course_id}, {"$inc": inc}, upsert=True)
+        for course_id, inc in increments.items()
+    ], ordered=False)
+
+# "buffered" acknowledges submissions once queued and writes them in batches (see write_behind.py)
+WRITE_MODE = os.environ.get("FEEDBACK_WRITE_MODE", "sync")
+write_buffer = None
+if WRITE_MODE == "buffered":
+    write_buffer = WriteBehindBuffer(
+        feedback_collection,
+        max_queue=int(os.environ.get("FEEDBACK_MAX_QUEUE", 10000)),
+        batch_size=int(os.environ.get("FEEDBACK_BATCH_SIZE", 500)),
+        flush_interval=float(os.environ.get("FEEDBACK_FLUSH_INTERVAL", 0.5)),
+        spool_dir=os.environ.get("FEEDBACK_SPOOL_DIR"),
+        on_flush=apply_rating_increments,
+    ).start()
 
 @app.route('/feedback', methods=['POST'])
 @swag_from({
@@ -52,7 +96,9 @@ feedback_collection = db.feedbacks
     ],
     'responses': {
         201: {'description': 'Feedback submitted successfully'},
-        400: {'description': 'Missing required fields'}
+        202: {'description': 'Feedback queued for writing (buffered mode)'},
+        400: {'description': 'Missing required fields or rating not between 1 and 5'},
+        503: {'description': 'Feedback queue is full, retry later'}
     }
 })
 def submit_feedback():
@@ -60,23 +106,65 @@ def submit_feedback():
     required_fields = ["username", "course_id", "rating", "comment"]
     if not all(field in data for field in required_fields):
         return jsonify({"message": "Missing required fields"}), 400
+    rating = data["rating"]
+    if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not MIN_RATING <= rating <= MAX_RATING:
+        return jsonify({"message": f"rating must be a number between {MIN_RATING} and {MAX_RATING}"}), 400
 
     feedback = {
         "username": data["username"],
         "course_id": data["course_id"],
         "rating": data["rating"],
         "comment": data["comment"],
-        "submitted_at": str(datetime.datetime.now())
+        "submitted_at": datetime.datetime.utcnow()
     }
 
+    if write_buffer:
+        try:
+            write_buffer.submit(feedback)
+        except BufferFull:
+            return jsonify({"message": "Too much feedback at once, retry later"}), 503, {"Retry-After": "1"}
+        return jsonify({"message": "Feedback accepted"}), 202
+
     feedback_collection.insert_one(feedback)
+    apply_rating_increments([feedback])
     return jsonify({"message": "Feedback submitted successfully"}), 201
 
+# A UTC offset after a time, written without the colon or with its "+" left unencoded
+# (a query string decodes it to a space)
+UTC_OFFSET_RE = re.compile(r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)([ +-])(\d{2}):?(\d{2})$")
+
+def parse_timestamp(value, name):
+    """ISO 8601 query parameter as the naive UTC datetime Mongo stores; raises ValueError"""
+    # Python 3.10's fromisoformat only takes +HH:MM offsets, not "Z", "+HHMM" or an unencoded "+"
+    value = str(value).strip()
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    value = UTC_OFFSET_RE.sub(lambda m: f"{m[1]}{'-' if m[2] == '-' else '+'}{m[3]}:{m[4]}", value)
+    try:
+        timestamp = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def feedback_query(course_id, args):
+    """Filter for course_id with optional since (inclusive) and until (exclusive); raises ValueError"""
+    query = {"course_id": course_id}
+    window = {}
+    if args.get('since'):
+        window["$gte"] = parse_timestamp(args['since'], 'since')
+    if args.get('until'):
+        window["$lt"] = parse_timestamp(args['until'], 'until')
+    if window:
+        query["submitted_at"] = window
+    return query
+
 @app.route('/feedback/<course_id>', methods=['GET'])
 @swag_from({
     'tags': ['Feedback'],
     'summary': 'Get feedback for a course',
-    'description': 'Retrieves all feedback entries for a given course ID.',
+    'description': 'Feedback for a course, newest first. Streams every entry unless limit or next is given.',
     'parameters': [
         {
             'name': 'course_id',
@@ -84,11 +172,21 @@ def submit_feedback():
             'type': 'string',
             'required': True,
             'description': 'Course ID to retrieve feedback for'
-        }
+        },
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': f'Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE}); omit with next to stream all feedback'},
+        {'name': 'next', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Opaque token from the previous page'},
+        {'name': 'since', 'in': 'query', 'type': 'string', 'format': 'date-time', 'required': False,
+         'description': 'Only feedback submitted at or after this time (ISO 8601, UTC unless an offset is given)'},
+        {'name': 'until', 'in': 'query', 'type': 'string', 'format': 'date-time', 'required': False,
+         'description': 'Only feedback submitted before this time'},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'required': False,
+         'enum': ['json', 'ndjson'], 'description': 'Streaming format when not paginating'}
     ],
     'responses': {
         200: {
-            'description': 'List of feedback entries',
+            'description': 'Feedback entries streamed as a list, or {"feedback": [...], "next": token} when paginating',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -98,16 +196,174 @@ def submit_feedback():
                         'course_id': {'type': 'string'},
                         'rating': {'type': 'number'},
                         'comment': {'type': 'string'},
-                        'submitted_at': {'type': 'string'}
+                        'submitted_at': {'type': 'string', 'format': 'date-time'}
                     }
                 }
             }
-        }
+        },
+        400: {'description': 'Invalid limit, next token, since or until'}
     }
 })
 def get_feedback(course_id):
-    feedbacks = list(feedback_collection.find({"course_id": course_id}, {"_id": 0}))
-    return jsonify(feedbacks), 200
+    paginate = 'limit' in request.args or 'next' in request.args
+    try:
+        query = feedback_query(course_id, request.args)
+        if paginate:
+            limit = parse_limit(request.args, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+            if request.args.get('next'):
+                position = decode_cursor(request.args['next'])
+                before = parse_timestamp(position["before"], 'next')
+                before_id = ObjectId(position["id"])
+                query = {"$and": [query, {"$or": [
+                    {"submitted_at": {"$lt": before}},
+                    {"submitted_at": before, "_id": {"$lt": before_id}}
+                ]}]}
+    except (KeyError, TypeError, InvalidId):
+        return jsonify({"message": "Invalid next token"}), 400
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if not paginate:
+        cursor = feedback_collection.find(query, {"_id": 0}).sort(FEEDBACK_ORDER).batch_size(STREAM_BATCH_SIZE)
+        return stream_cursor(cursor, request.args.get('format', 'json'))
+
+    feedbacks, next_token = fetch_page(feedback_collection.find(query).sort(FEEDBACK_ORDER), limit,
+                                       lambda last: {"before": last["submitted_at"], "id": last["_id"]})
+    for feedback in feedbacks:
+        del feedback["_id"]
+    return jsonify({"feedback": feedbacks, "next": next_token}), 200
+
+@app.route('/feedback/<course_id>/stats', methods=['GET'])
+@swag_from({
+    'tags': ['Feedback'],
+    'summary': 'Rating summary for a course',
+    'description': 'Count, average, standard deviation and 1-5 star histogram, read from a precomputed aggregate.',
+    'parameters': [
+        {
+            'name': 'course_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Rating summary',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'course_id': {'type': 'string'},
+                    'count': {'type': 'integer'},
+                    'average': {'type': 'number'},
+                    'stddev': {'type': 'number'},
+                    'histogram': {'type': 'object', 'additionalProperties': {'type': 'integer'}}
+                }
+            }
+        }
+    }
+})
+def get_feedback_stats(course_id):
+    stats = rating_stats_collection.find_one({"course_id": course_id}, {"_id": 0}) or {}
+    count = stats.get("count", 0)
+    histogram = stats.get("histogram", {})
+    summary = {
+        "course_id": course_id,
+        "count": count,
+        "average": None,
+        "stddev": None,
+        "histogram": {star: histogram.get(star, 0) for star in HISTOGRAM_BUCKETS}
+    }
+    if count:
+        mean = stats["sum"] / count
+        # Population variance from the running sums; clamp float rounding below zero
+        variance = max(stats["sum_squares"] / count - mean * mean, 0.0)
+        summary.update(average=round(mean, 4), stddev=round(math.sqrt(variance), 4))
+    return jsonify(summary), 200
+
+@app.route('/metrics/circuit_breakers', methods=['GET'])
+@swag_from({
+    'tags': ['Metrics'],
+    'summary': 'Circuit breaker and bulkhead state per downstream service',
+    'responses': {
+        200: {'description': 'Breaker state, in-flight calls and rejection counts'}
+    }
+})
+def circuit_breaker_metrics():
+    return jsonify(breaker_metrics())
+
+@app.route('/metrics/write_buffer', methods=['GET'])
+@swag_from({
+    'tags': ['Metrics'],
+    'summary': 'Write-behind queue depth and flush counters',
+    'responses': {
+        200: {'description': 'Queue depth, documents flushed, batches and rejections; mode is sync when buffering is off'}
+    }
+})
+def write_buffer_metrics():
+    if not write_buffer:
+        return jsonify({"mode": WRITE_MODE})
+    return jsonify({"mode": WRITE_MODE, **write_buffer.stats()})
+
+@app.cli.command('rebuild-rating-stats')
+@click.option('--dry-run', is_flag=True, help='Only report drift, do not rewrite the aggregates.')
+def rebuild_rating_stats(dry_run):
+    """Recompute course_rating_stats from the feedbacks collection."""
+    bucket = {"$toString": {"$floor": {"$add": ["$rating", 0.5]}}}
+    pipeline = [
+        {"$match": {"rating": {"$gte": MIN_RATING, "$lte": MAX_RATING}}},
+        {"$group": {
+            "_id": "$course_id",
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$rating"},
+            "sum_squares": {"$sum": {"$multiply": ["$rating", "$rating"]}},
+            **{f"h{star}": {"$sum": {"$cond": [{"$eq": [bucket, star]}, 1, 0]}} for star in HISTOGRAM_BUCKETS}
+        }}
+    ]
+    actual = {
+        row["_id"]: {"count": row["count"], "sum": row["sum"], "sum_squares": row["sum_squares"],
+                     "histogram": {star: row[f"h{star}"] for star in HISTOGRAM_BUCKETS if row[f"h{star}"]}}
+        for row in feedback_collection.aggregate(pipeline)
+    }
+    stored = {doc.pop("course_id"): doc for doc in rating_stats_collection.find({}, {"_id": 0})}
+
+    operations = []
+    for course_id, expected in actual.items():
+        if stored.get(course_id) != expected:
+            click.echo(f"course_id={course_id!r}: stored={stored.get(course_id)} actual={expected}")
+            operations.append(ReplaceOne({"course_id": course_id}, {"course_id": course_id, **expected}, upsert=True))
+    orphaned = [course_id for course_id in stored if course_id not in actual]
+    if orphaned:
+        click.echo(f"{len(orphaned)} aggregate(s) for courses without feedback")
+        operations.append(DeleteMany({"course_id": {"$in": orphaned}}))
+
+    click.echo(f"{len(operations)} rating aggregate operation(s) needed across {len(actual)} course(s)")
+    if operations and not dry_run:
+        rating_stats_collection.bulk_write(operations, ordered=False)
+        click.echo("Rating aggregates rebuilt")
+
+@app.cli.command('migrate-submitted-at')
+@click.option('--batch-size', default=1000, show_default=True)
+def migrate_submitted_at(batch_size):
+    """Convert submitted_at strings written by older versions to native datetimes."""
+    # Older versions wrote str(datetime.now()) in the container's local time, which is UTC
+    legacy = feedback_collection.find({"submitted_at": {"$type": "string"}}, {"submitted_at": 1})
+    operations, converted, unparseable = [], 0, 0
+    for feedback in legacy.batch_size(batch_size):
+        try:
+            submitted_at = parse_timestamp(feedback["submitted_at"], 'submitted_at')
+        except ValueError:
+            unparseable += 1
+            click.echo(f"_id={feedback['_id']}: cannot parse submitted_at={feedback['submitted_at']!r}")
+            continue
+        # Matching on the old string keeps a rerun, or a concurrent one, from touching converted documents
+        operations.append(UpdateOne({"_id": feedback["_id"], "submitted_at": feedback["submitted_at"]},
+                                    {"$set": {"submitted_at": submitted_at}}))
+        if len(operations) == batch_size:
+            converted += feedback_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        converted += feedback_collection.bulk_write(operations, ordered=False).modified_count
+    click.echo(f"Converted {converted} submitted_at value(s), {unparseable} left as strings")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5006)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5006)))
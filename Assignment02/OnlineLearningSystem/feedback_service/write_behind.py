@@ -0,0 +1,189 @@
+"""
+Write-behind buffer for feedback submissions.
+
+submit() acknowledges a document once it is in a bounded in-memory queue (and,
+with a spool directory, appended to a local NDJSON file). A background thread
+writes queued documents with insert_many whenever batch_size of them are waiting
+or flush_interval has passed. A full queue raises BufferFull so callers can push
+back, and close() drains the queue on shutdown. on_flush, if given, is called
+with the documents each flush actually inserted.
+
+Documents get their _id before they are queued, so replaying a spool file after
+a crash never inserts the same submission twice.
+"""
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class BufferFull(Exception):
+    """Raised by submit() when the queue stays full for put_timeout seconds"""
+
+
+class WriteBehindBuffer:
+    def __init__(self, collection, max_queue=10000, batch_size=500, flush_interval=0.5,
+                 put_timeout=0.1, spool_dir=None, on_flush=None):
+        self.collection = collection
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.spool_dir = spool_dir
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        self._spool = None
+        self._thread = None
+        # Set once a batch is given up on; the spool file is then never truncated again
+        self._unflushed = False
+        self.flushed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def start(self):
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._replay_orphaned_spools()
+            self._spool = open(os.path.join(self.spool_dir, f"spool-{os.getpid()}.ndjson"), "a")
+        self._thread = threading.Thread(target=self._run, name="feedback-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def submit(self, document):
+        document["_id"] = ObjectId()
+        try:
+            self._queue.put(document, timeout=self.put_timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise BufferFull("Feedback queue is full")
+        if self._spool:
+            with self._spool_lock:
+                self._spool.write(json_util.dumps(document) + "\n")
+                self._spool.flush()
+        return document["_id"]
+
+    def close(self, timeout=10):
+        """Tell the flusher to write everything still queued, then wait for it"""
+        if self._thread and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "max_queue": self._queue.maxsize, "flushed": self.flushed,
+                "batches": self.batches, "rejected": self.rejected, "last_error": self.last_error,
+                "spool": bool(self._spool)}
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 and not self._stop.is_set()
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            # A batch that could not be written stays in the spool file for the next start to replay
+            if batch and self._write(batch):
+                self._truncate_spool_if_drained()
+
+    def _write(self, batch):
+        """Insert the batch, retrying with backoff; returns False if it was given up on"""
+        delay = 0.1
+        while True:
+            try:
+                inserted = self._insert(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+                self._notify(inserted)
+                return True
+            except PyMongoError as e:
+                self.last_error = str(e)
+                logger.error("Flushing %d feedback document(s) failed: %s", len(batch), e)
+                if self._stop.is_set() and delay > 5:
+                    # Shutting down with Mongo unreachable; the spool file, if any, still has them
+                    self._unflushed = True
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def _insert(self, batch):
+        """Insert the batch and return the documents that were not already there"""
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Already written by an earlier attempt or a spool replay
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+            duplicates = {error["index"] for error in e.details["writeErrors"]}
+            return [document for i, document in enumerate(batch) if i not in duplicates]
+        return batch
+
+    def _notify(self, inserted):
+        # The documents are in Mongo either way; a failing hook must not cause them to be re-inserted
+        if self.on_flush and inserted:
+            try:
+                self.on_flush(inserted)
+            except Exception as e:
+                logger.error("on_flush failed for %d feedback document(s): %s", len(inserted), e)
+
+    def _truncate_spool_if_drained(self):
+        # Only the flusher takes from the queue, so once it is empty every spooled line is in
+        # Mongo, unless an earlier batch was given up on
+        if self._spool and not self._unflushed and self._queue.empty():
+            with self._spool_lock:
+                if self._queue.empty():
+                    self._spool.truncate(0)
+
+    def _replay_orphaned_spools(self):
+        """Insert what a crashed or killed process acknowledged but never flushed"""
+        for path in glob.glob(os.path.join(self.spool_dir, "spool-*.ndjson")):
+            pid = int(os.path.basename(path)[len("spool-"):-len(".ndjson")])
+            if pid != os.getpid() and _process_alive(pid):
+                continue
+            claimed = f"{path}.replaying-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # Another worker claimed it first
+            with open(claimed) as f:
+                documents = [json_util.loads(line) for line in f if line.strip()]
+            try:
+                for start in range(0, len(documents), self.batch_size):
+                    self._notify(self._insert(documents[start:start + self.batch_size]))
+            except PyMongoError:
+                os.rename(claimed, path)  # Leave it for the next worker to start
+                raise
+            logger.info("Replayed %d feedback document(s) from %s", len(documents), path)
+            os.remove(claimed)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
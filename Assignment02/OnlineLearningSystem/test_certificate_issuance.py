@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Fire hundreds of parallel /generate calls for one (user_id, course_id) pair and
+check that exactly one certificate is created, without the contention slowing
+issuance down. Runs against the docker-compose stack (mongo is published on port 27016),
+so it is a script driven by main() rather than a pytest module, like test_query_plans.py.
+"""
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from pymongo import MongoClient
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+CERTIFICATE_API = "http://localhost:5004"
+USER_PREFIX = "cert_race_"
+PARALLEL_REQUESTS = 300
+# Same-pair p99 may exceed the distinct-pairs p99 by this factor plus a little scheduling noise
+MAX_SLOWDOWN = 2.0
+NOISE_MS = 50
+
+
+def issue(user_id, course_id):
+    """Return (status code, response body, milliseconds) for one /generate call"""
+    start = time.perf_counter()
+    response = requests.post(f"{CERTIFICATE_API}/generate", json={"user_id": user_id, "course_id": course_id})
+    return response.status_code, response.json(), (time.perf_counter() - start) * 1000
+
+
+def burst(pairs):
+    with ThreadPoolExecutor(max_workers=len(pairs)) as pool:
+        return list(pool.map(lambda pair: issue(*pair), pairs))
+
+
+def p99(results):
+    latencies = sorted(ms for _, _, ms in results)
+    return latencies[int(len(latencies) * 0.99) - 1]
+
+
+def check_exactly_one_certificate(db):
+    """Every caller gets the same certificate back and only one document exists"""
+    results = burst([(f"{USER_PREFIX}same", "101")] * PARALLEL_REQUESTS)
+    statuses = [status for status, _, _ in results]
+    created = statuses.count(201)
+    existing = statuses.count(200)
+    stored = db.certificates.count_documents({"user_id": f"{USER_PREFIX}same", "course_id": "101"})
+    bodies = {body.get("certificate", {}).get("issued_on") if status == 200 else body["issued_on"]
+              for status, body, _ in results}
+    print(f"{created} created, {existing} already existed, {stored} stored, {len(bodies)} distinct issued_on")
+    print(f"p50 {statistics.median(ms for _, _, ms in results):.1f} ms, p99 {p99(results):.1f} ms")
+    return created == 1 and existing == PARALLEL_REQUESTS - 1 and stored == 1 and len(bodies) == 1
+
+
+def check_contention_does_not_degrade_latency():
+    """One hot pair is no slower than the same number of requests spread over distinct pairs"""
+    distinct = burst([(f"{USER_PREFIX}{i}", "102") for i in range(PARALLEL_REQUESTS)])
+    same = burst([(f"{USER_PREFIX}hot", "102")] * PARALLEL_REQUESTS)
+    print(f"p99 distinct pairs {p99(distinct):.1f} ms, same pair {p99(same):.1f} ms")
+    return p99(same) <= p99(distinct) * MAX_SLOWDOWN + NOISE_MS
+
+
+def main():
+    """Run all checks"""
+    db = MongoClient(MONGO_URL).online_learning
+    db.certificates.delete_many({"user_id": {"$regex": f"^{USER_PREFIX}"}})
+
+    print("🚀 Testing concurrent certificate issuance")
+    print("=" * 50)
+    try:
+        print(f"\n1. {PARALLEL_REQUESTS} parallel requests for one pair...")
+        single = check_exactly_one_certificate(db)
+
+        print("\n2. Latency under contention...")
+        fast = check_contention_does_not_degrade_latency()
+    finally:
+        db.certificates.delete_many({"user_id": {"$regex": f"^{USER_PREFIX}"}})
+
+    print("\n" + "=" * 50)
+    print("📊 TEST SUMMARY")
+    print("=" * 50)
+    print(f"Exactly one certificate: {'✅ PASS' if single else '❌ FAIL'}")
+    print(f"Latency not degraded:    {'✅ PASS' if fast else '❌ FAIL'}")
+    return 0 if single and fast else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Show that upstream latency and failures do not cascade through ResilientClient.
+Runs against a local flaky stub course service, no docker-compose stack needed.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stub_course_service import StubCourseService
+from common.resilience import CLOSED, OPEN, ResilientClient
+
+
+def call(client):
+    """Return (outcome, seconds) for a single GET"""
+    start = time.perf_counter()
+    try:
+        client.get("/course/1")
+        outcome = "ok"
+    except requests.exceptions.RequestException as e:
+        outcome = type(e).__name__
+    return outcome, time.perf_counter() - start
+
+
+def test_circuit_opens_and_fails_fast():
+    """A failing upstream opens the circuit, after which calls return without touching it"""
+    stub = StubCourseService(latency=0.01, failure_rate=1.0).start()
+    try:
+        client = ResilientClient("flaky", stub.url, failure_threshold=3, reset_timeout=60, max_retries=0)
+        for _ in range(3):
+            call(client)
+        upstream_calls = stub.requests
+        outcome, seconds = call(client)
+        print(f"State after 3 failures: {client.breaker.state}, next call: {outcome} in {seconds * 1000:.2f} ms")
+        assert client.breaker.state == OPEN
+        assert outcome == "CircuitOpenError"
+        assert seconds < 0.005
+        assert stub.requests == upstream_calls
+    finally:
+        stub.stop()
+
+
+def test_half_open_recovers():
+    """After reset_timeout one trial call goes through and closes the circuit again"""
+    stub = StubCourseService(latency=0.01, failure_rate=1.0).start()
+    try:
+        client = ResilientClient("recovering", stub.url, failure_threshold=2, reset_timeout=0.2, max_retries=0)
+        call(client)
+        call(client)
+        stub.failure_rate = 0.0
+        time.sleep(0.25)
+        outcome, _ = call(client)
+        print(f"Trial call after reset timeout: {outcome}, state: {client.breaker.state}")
+        assert outcome == "ok"
+        assert client.breaker.state == CLOSED
+    finally:
+        stub.stop()
+
+
+def test_slow_upstream_does_not_pile_up():
+    """100 callers against a 5 s upstream finish within the read timeout, most rejected at once"""
+    stub = StubCourseService(latency=5.0).start()
+    try:
+        client = ResilientClient("slow", stub.url, read_timeout=0.5, max_concurrent=5,
+                                 failure_threshold=1000, max_retries=0)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=100) as pool:
+            results = list(pool.map(lambda _: call(client), range(100)))
+        wall = time.perf_counter() - start
+        rejected = sum(1 for outcome, _ in results if outcome == "BulkheadFullError")
+        slowest = max(seconds for _, seconds in results)
+        print(f"100 callers: {rejected} rejected by bulkhead, slowest {slowest:.2f} s, wall {wall:.2f} s")
+        assert rejected >= 90
+        assert slowest < 1.0
+    finally:
+        stub.stop()
+
+
+def passes(test):
+    """Run a test for the script summary; pytest runs the same functions directly"""
+    try:
+        test()
+        return True
+    except AssertionError as e:
+        print(f"Assertion failed: {e}")
+        return False
+
+
+def main():
+    """Run all tests"""
+    print("🚀 Testing circuit breaker and bulkhead")
+    print("=" * 50)
+
+    print("\n1. Circuit opens and fails fast...")
+    fails_fast = passes(test_circuit_opens_and_fails_fast)
+
+    print("\n2. Half-open trial recovers...")
+    recovers = passes(test_half_open_recovers)
+
+    print("\n3. Slow upstream does not pile up callers...")
+    bounded = passes(test_slow_upstream_does_not_pile_up)
+
+    print("\n" + "=" * 50)
+    print("📊 TEST SUMMARY")
+    print("=" * 50)
+    print(f"Fail fast when open: {'✅ PASS' if fails_fast else '❌ FAIL'}")
+    print(f"Half-open recovery:  {'✅ PASS' if recovers else '❌ FAIL'}")
+    print(f"Latency contained:   {'✅ PASS' if bounded else '❌ FAIL'}")
+    return 0 if fails_fast and recovers and bounded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
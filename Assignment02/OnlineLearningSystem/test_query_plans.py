@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Verify that every production query is served by an index.
+Runs explain() for each query against a scratch database on the docker-compose
+mongo (published on port 27016) and fails if any winning plan contains COLLSCAN.
+"""
+import datetime
+import sys
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+from common.indexes import INDEXES, ensure_indexes
+
+# Configuration
+MONGO_URL = "mongodb://localhost:27016/"
+TEST_DB = "online_learning_query_plans"
+
+
+def find_plan(collection, query, projection=None, sort=None, limit=0):
+    cursor = collection.find(query, projection)
+    if sort:
+        cursor = cursor.sort(*sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor.explain()
+
+
+def aggregate_plan(collection, pipeline):
+    return collection.database.command("aggregate", collection.name, pipeline=pipeline, explain=True)
+
+
+def production_queries(db):
+    """(description, explain output) for each query the services run"""
+    return [
+        ("users: find by username (register/login/token_required/get_user/update/delete)",
+         find_plan(db.users, {"username": "john_doe"})),
+        ("users: keyset page after username (/users, /testusers)",
+         find_plan(db.users, {"username": {"$gt": "john_doe"}}, {"_id": 0, "username": 1, "email": 1},
+                   sort=("username", ASCENDING), limit=101)),
+        ("users: batch find by username $in (/users/batch)",
+         find_plan(db.users, {"username": {"$in": ["user0", "user1"]}}, {"_id": 0, "username": 1})),
+        ("courses: find by course_id (get/add/update/delete course)",
+         find_plan(db.courses, {"course_id": 1}, {"_id": 0})),
+        ("courses: batch find by course_id $in",
+         find_plan(db.courses, {"course_id": {"$in": [1, 2, 3]}}, {"_id": 0, "course_id": 1, "title": 1})),
+        ("courses: full catalog stream ordered by course_id",
+         find_plan(db.courses, {}, {"_id": 0}, sort=("course_id", ASCENDING))),
+        ("courses: keyset page after course_id",
+         find_plan(db.courses, {"course_id": {"$gt": 1}}, {"_id": 0}, sort=("course_id", ASCENDING), limit=51)),
+        ("courses: text search ranked by score (/courses/search)",
+         find_plan(db.courses, {"$text": {"$search": "python"}}, {"_id": 0, "score": {"$meta": "textScore"}},
+                   sort=([("score", {"$meta": "textScore"}), ("course_id", ASCENDING)],), limit=21)),
+        ("enrollments: find by username (/my-courses)",
+         find_plan(db.enrollments, {"username": "john_doe"}, {"_id": 0})),
+        ("enrollments: find by username + course_id (update/delete enrollment)",
+         find_plan(db.enrollments, {"username": "john_doe", "course_id": 1})),
+        ("enrollments: find by course_id",
+         find_plan(db.enrollments, {"course_id": 1})),
+        ("course_enrollment_counts: upsert by course_id",
+         find_plan(db.course_enrollment_counts, {"course_id": 1})),
+        ("course_enrollment_counts: sorted by count (/stats/enrollments)",
+         find_plan(db.course_enrollment_counts, {"count": {"$gt": 0}}, sort=("count", DESCENDING))),
+        ("course_enrollment_counts: top N with titles (/stats/popular_courses)",
+         aggregate_plan(db.course_enrollment_counts, [
+             {"$match": {"count": {"$gt": 0}}},
+             {"$sort": {"count": -1}},
+             {"$limit": 5},
+             {"$lookup": {"from": "courses", "localField": "course_id", "foreignField": "course_id",
+                          "pipeline": [{"$project": {"_id": 0, "title": 1}}], "as": "course"}}
+         ])),
+        ("certificates: find by user_id + course_id",
+         find_plan(db.certificates, {"user_id": "john_doe", "course_id": "1"})),
+        ("certificates: unrendered artifacts (flask render-pending)",
+         find_plan(db.certificates, {"render_status": {"$in": ["queued", None]}}, {"_id": 0, "user_id": 1, "course_id": 1})),
+        ("certificates: cohort learners without a certificate (flask issue-cohort)",
+         aggregate_plan(db.enrollments, [
+             {"$match": {"course_id": {"$in": ["1", 1]}, "username": {"$gt": "user0"}}},
+             {"$sort": {"username": 1}},
+             {"$lookup": {"from": "certificates", "localField": "username", "foreignField": "user_id",
+                          "pipeline": [{"$match": {"course_id": "1"}}, {"$limit": 1}, {"$project": {"_id": 1}}],
+                          "as": "held"}},
+             {"$match": {"held": []}},
+             {"$project": {"_id": 0, "username": 1}}
+         ])),
+        ("feedbacks: newest first by course_id (/feedback/<course_id> stream)",
+         find_plan(db.feedbacks, {"course_id": "1"}, {"_id": 0},
+                   sort=([("submitted_at", DESCENDING), ("_id", DESCENDING)],))),
+        ("feedbacks: keyset page within a time window",
+         find_plan(db.feedbacks, {"$and": [
+             {"course_id": "1", "submitted_at": {"$gte": datetime.datetime(2024, 1, 1), "$lt": datetime.datetime(2025, 1, 1)}},
+             {"$or": [{"submitted_at": {"$lt": datetime.datetime(2024, 6, 1)}},
+                      {"submitted_at": datetime.datetime(2024, 6, 1), "_id": {"$lt": ObjectId()}}]}
+         ]}, sort=([("submitted_at", DESCENDING), ("_id", DESCENDING)],), limit=51)),
+        ("course_rating_stats: find by course_id (/feedback/<course_id>/stats and upserts)",
+         find_plan(db.course_rating_stats, {"course_id": "1"}, {"_id": 0})),
+    ]
+
+
+def collscan_stages(node):
+    """Yield every COLLSCAN stage in an explain document, ignoring rejected plans"""
+    if isinstance(node, dict):
+        if node.get("stage") == "COLLSCAN":
+            yield node
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                yield from collscan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from collscan_stages(item)
+
+
+def seed(db):
+    """Give the planner a couple of documents per collection so it has something to choose from"""
+    db.users.insert_many([{"username": f"user{i}"} for i in range(2)])
+    db.courses.insert_many([{"course_id": i, "title": f"Course {i}"} for i in range(2)])
+    db.enrollments.insert_many([{"username": f"user{i}", "course_id": i} for i in range(2)])
+    db.course_enrollment_counts.insert_many([{"course_id": i, "count": 1} for i in range(2)])
+    db.certificates.insert_many([{"user_id": f"user{i}", "course_id": str(i)} for i in range(2)])
+    db.feedbacks.insert_many([{"course_id": str(i), "rating": 5, "submitted_at": datetime.datetime(2024, 6, i + 1)}
+                              for i in range(2)])
+    db.course_rating_stats.insert_many([{"course_id": str(i), "count": 1} for i in range(2)])
+
+
+def main():
+    client = MongoClient(MONGO_URL)
+    client.drop_database(TEST_DB)
+    db = client[TEST_DB]
+
+    print("🔎 Checking query plans for COLLSCAN")
+    print("=" * 50)
+    failures = 0
+    try:
+        ensure_indexes(db, *INDEXES)
+        seed(db)
+        for description, plan in production_queries(db):
+            if any(collscan_stages(plan)):
+                failures += 1
+                print(f"❌ {description}")
+            else:
+                print(f"✅ {description}")
+    finally:
+        client.drop_database(TEST_DB)
+
+    print("=" * 50)
+    print(f"{failures} query plan(s) with COLLSCAN")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
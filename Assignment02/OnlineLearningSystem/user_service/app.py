@@ -1,12 +1,20 @@
 from flask import Flask, request, jsonify
+import os
+import click
 from pymongo import MongoClient
-import jwt
-import datetime
 from functools import wraps
 from flasgger import Swagger, swag_from
+from common.indexes import ensure_indexes
+from common.json_provider import register_json_provider
+from common.cache import TTLCache
+from common.auth import bearer_token, decode_token, issue_token
+from common.pagination import decode_cursor, fetch_page, parse_limit
+from common.streaming import stream_cursor
+from passwords import HashingBusy, hash_password, needs_rehash, verify_password
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'my_secret_key'  # Change this to a secure value
+register_json_provider(app)
+# JWT signing keys: see common/auth.py (JWT_KEYSET_PATH / JWT_SECRET_KEY)
 # http://localhost:5001/apidocs/#/
 
 swagger_config = {
@@ -27,24 +35,76 @@ swagger_config = {
 
 swagger = Swagger(app, config=swagger_config)
 
-client = MongoClient("mongodb://mongo:27017/")
+client = MongoClient(os.environ.get("MONGO_URL", "mongodb://mongo:27017/"))
 db = client.online_learning
 users_collection = db.users
+ensure_indexes(db, "users")
+
+# Left out of /get_user, which returns every other stored field
+SENSITIVE_FIELDS = {"_id", "password"}
+# Optional profile fields /register stores next to username and password
+PROFILE_FIELDS = ["email", "name", "first_name", "last_name"]
+# Managed by the service, never taken from a request body; roles are granted with `flask set-role`
+PROTECTED_FIELDS = ["role", "token_version"]
+# Upper bound on usernames accepted by /users/batch in a single request
+MAX_BATCH_SIZE = 5000
+# Fields lookup endpoints may be asked for; anything else (password, _id, paths, operators) is a 400
+USER_FIELDS = ["username", *PROFILE_FIELDS, "role"]
+# Returned by /users and /testusers unless ?fields= asks for fewer
+DEFAULT_USER_FIELDS = USER_FIELDS
+# Default and largest ?limit= for /users and /testusers; without one, users stream in Mongo batches this big
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+
+def user_projection(fields):
+    """Inclusion projection for the requested fields, always with username; raises ValueError
+    unless every field is one of USER_FIELDS"""
+    if not all(field in USER_FIELDS for field in fields):
+        raise ValueError(f"fields must be among: {', '.join(USER_FIELDS)}")
+    projection = {field: 1 for field in fields}
+    projection.update({"_id": 0, "username": 1})
+    return projection
+
+# Tokens carry the user's token_version ("tv" claim) from login; bumping it in Mongo
+# (password change) or deleting the user revokes every token issued before.
+# username -> current token_version, so token_required can skip the users lookup.
+# The cache is per gunicorn worker: the worker that handles a change drops its entry at once,
+# the others keep accepting revoked tokens for at most TOKEN_CACHE_TTL seconds.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 5
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+def invalidate_user_tokens(username):
+    token_cache.pop(username)
+
+def current_token_version(username):
+    """token_version stored for username, or None if the user no longer exists"""
+    version = token_cache.get(username)
+    if version is None:
+        user = users_collection.find_one({"username": username}, {"_id": 1, "token_version": 1})
+        if not user:
+            return None
+        version = user.get("token_version", 0)
+        token_cache.set(username, version)
+    return version
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if token and token.startswith("Bearer "):
-            token = token.split(" ")[1]
-        else:
+        token = bearer_token()
+        if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = users_collection.find_one({"username": data['username']})
-            if not current_user:
+            # Always verify signature and exp; the cache only replaces the database round trip
+            data = decode_token(token)
+            version = current_token_version(data['username'])
+            if version is None:
                 raise Exception('User not found')
+            # Tokens issued before token versions existed carry no tv claim
+            if data.get('tv', 0) != version:
+                raise Exception('Token has been revoked')
         except Exception as e:
             return jsonify({'message': f'Token is invalid: {str(e)}'}), 401
 
@@ -78,7 +138,7 @@ def token_required(f):
             }
         },
         400: {
-            'description': 'User already exists',
+            'description': 'User already exists, or username or password is not a string',
             'schema': {
                 'type': 'object',
                 'properties': {
@@ -99,9 +159,16 @@ def token_required(f):
 })
 def register():
     data = request.json
+    if not isinstance(data.get('username'), str) or not isinstance(data.get('password'), str):
+        return jsonify({"message": "username and password must be strings"}), 400
     if users_collection.find_one({"username": data['username']}):
         return jsonify({"message": "User already exists"}), 400
-    users_collection.insert_one(data)
+    user = {field: data[field] for field in PROFILE_FIELDS if field in data}
+    try:
+        user.update(username=data['username'], password=hash_password(data['password']))
+    except HashingBusy:
+        return jsonify({"message": "Server busy, try again"}), 503
+    users_collection.insert_one(user)
     return jsonify({"message": "User registered successfully"})
 
 @app.route('/login', methods=['POST'])
@@ -122,20 +189,27 @@ def register():
     }],
     'responses': {
         200: {'description': 'Token returned'},
-        401: {'description': 'Invalid credentials'}
+        400: {'description': 'Password is not a string'},
+        401: {'description': 'Invalid credentials'},
+        503: {'description': 'Too many logins in progress'}
     }
 })
 def login():
     data = request.json
-    user = users_collection.find_one({"username": data['username']})
-    if not user or user.get('password') != data['password']:
-        return jsonify({'message': 'Invalid credentials'}), 401
-
-    token = jwt.encode({
-        'username': user['username'],
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+    if not isinstance(data.get('password'), str):
+        return jsonify({"message": "password must be a string"}), 400
+    user = users_collection.find_one({"username": data['username']}, {"username": 1, "password": 1, "token_version": 1})
+    try:
+        if not user or not verify_password(data['password'], user.get('password')):
+            return jsonify({'message': 'Invalid credentials'}), 401
+        # Legacy plaintext records (and hashes from an older work factor) are upgraded on first login
+        if needs_rehash(user['password']):
+            users_collection.update_one({"_id": user['_id'], "password": user['password']},
+                                        {"$set": {"password": hash_password(data['password'])}})
+    except HashingBusy:
+        return jsonify({'message': 'Server busy, try again'}), 503
 
+    token = issue_token(user['username'], tv=user.get('token_version', 0))
     return jsonify({'token': token})
 
 @app.route('/get_user/<username>', methods=['GET'])
@@ -154,11 +228,100 @@ def login():
     }
 })
 def get_user(username):
-    user = users_collection.find_one({"username": username}, {"_id": 0})
+    user = users_collection.find_one({"username": username}, {field: 0 for field in SENSITIVE_FIELDS})
     if user:
         return jsonify(user)
     return jsonify({"message": "User not found"}), 404
 
+@app.route('/users/batch', methods=['POST'])
+@token_required
+@swag_from({
+    'tags': ['Users'],
+    'summary': 'Look up many users in one call',
+    'parameters': [
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'required': True
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'usernames': {'type': 'array', 'items': {'type': 'string'}},
+                    'fields': {'type': 'array', 'items': {'type': 'string'}}
+                },
+                'required': ['usernames']
+            }
+        }
+    ],
+    'responses': {
+        200: {'description': 'Found users with the requested fields, plus the usernames that do not exist'},
+        400: {'description': 'usernames missing, not a list of strings or too long, or fields not user fields'}
+    }
+})
+def get_users_batch():
+    data = request.get_json(silent=True) or {}
+    usernames = data.get('usernames')
+    fields = data.get('fields') or []
+    if not isinstance(usernames, list) or not all(isinstance(name, str) for name in usernames):
+        return jsonify({"message": "usernames must be a list of strings"}), 400
+    if len(usernames) > MAX_BATCH_SIZE:
+        return jsonify({"message": f"At most {MAX_BATCH_SIZE} usernames per request"}), 400
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        return jsonify({"message": "fields must be a list of strings"}), 400
+    try:
+        projection = user_projection(fields)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    wanted = list(dict.fromkeys(usernames))
+    users = list(users_collection.find({"username": {"$in": wanted}}, projection))
+    found = {user["username"] for user in users}
+    return jsonify({"users": users, "unknown": [name for name in wanted if name not in found]})
+
+def list_users():
+    """Shared by /users and /testusers: stream everything, or one keyset page on username"""
+    fields = request.args.get('fields')
+    # Checked before streaming: once the 200 headers are out, an error can only truncate the body
+    try:
+        projection = user_projection(fields.split(',') if fields else DEFAULT_USER_FIELDS)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if 'limit' not in request.args and 'next' not in request.args:
+        cursor = users_collection.find({}, projection).sort('username', 1).batch_size(STREAM_BATCH_SIZE)
+        return stream_cursor(cursor, request.args.get('format', 'json'))
+
+    try:
+        limit = parse_limit(request.args, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query = {}
+        if request.args.get('next'):
+            query = {"username": {"$gt": decode_cursor(request.args['next'])["after"]}}
+    except KeyError:
+        return jsonify({"message": "Invalid next token"}), 400
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    users, next_token = fetch_page(users_collection.find(query, projection).sort('username', 1), limit,
+                                   lambda last: {"after": last["username"]})
+    return jsonify({"users": users, "next": next_token})
+
+LIST_USERS_PARAMETERS = [
+    {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+     'description': f'Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE}); omit with next to stream all users'},
+    {'name': 'next', 'in': 'query', 'type': 'string', 'required': False,
+     'description': 'Opaque token from the previous page'},
+    {'name': 'fields', 'in': 'query', 'type': 'string', 'required': False,
+     'description': f'Comma-separated fields among {",".join(USER_FIELDS)} (default all of them)'},
+    {'name': 'format', 'in': 'query', 'type': 'string', 'required': False,
+     'enum': ['json', 'ndjson'], 'description': 'Streaming format when not paginating'}
+]
+
 @app.route('/users', methods=['GET'])
 @token_required
 @swag_from({
@@ -168,14 +331,14 @@ def get_user(username):
         'in': 'header',
         'type': 'string',
         'required': True
-    }],
+    }] + LIST_USERS_PARAMETERS,
     'responses': {
-        200: {'description': 'All users returned'}
+        200: {'description': 'All users streamed, or {"users": [...], "next": token} when paginating'},
+        400: {'description': 'Invalid limit, next token or fields'}
     }
 })
 def get_all_users():
-    users = users_collection.find({}, {"_id": 0})
-    return jsonify(list(users))
+    return list_users()
 
 
 
@@ -187,14 +350,14 @@ def get_all_users():
         'in': 'header',
         'type': 'string',
         'required': True
-    }],
+    }] + LIST_USERS_PARAMETERS,
     'responses': {
-        200: {'description': 'All users returned'}
+        200: {'description': 'All users streamed, or {"users": [...], "next": token} when paginating'},
+        400: {'description': 'Invalid limit, next token or fields'}
     }
 })
 def get_all_users_test():
-    users = users_collection.find({}, {"_id": 0})
-    return jsonify(list(users))
+    return list_users()
 
 @app.route('/user/<string:username>', methods=['PUT'])
 @token_required
@@ -233,8 +396,21 @@ def get_all_users_test():
 })
 def update_user(username):
     data = request.json
-    result = users_collection.update_one({"username": username}, {"$set": data})
+    for field in PROTECTED_FIELDS:
+        data.pop(field, None)
+    update = {"$set": data}
+    if 'password' in data:
+        if not isinstance(data['password'], str):
+            return jsonify({"message": "password must be a string"}), 400
+        try:
+            data['password'] = hash_password(data['password'])
+        except HashingBusy:
+            return jsonify({"message": "Server busy, try again"}), 503
+        # A new password revokes every token issued with the old one, in all workers
+        update["$inc"] = {"token_version": 1}
+    result = users_collection.update_one({"username": username}, update)
     if result.matched_count > 0:
+        invalidate_user_tokens(username)
         return jsonify({"message": "User updated"})
     else:
         return jsonify({"error": "User not found"}), 404
@@ -265,9 +441,31 @@ def update_user(username):
 def delete_user(username):
     result = users_collection.delete_one({"username": username})
     if result.deleted_count > 0:
+        invalidate_user_tokens(username)
         return jsonify({"message": "User deleted"})
     else:
         return jsonify({"error": "User not found"}), 404
 
+@app.route('/token_cache/stats', methods=['GET'])
+@swag_from({
+    'tags': ['Users'],
+    'summary': 'Token cache size and hit/miss counters',
+    'responses': {
+        200: {'description': 'Token cache statistics'}
+    }
+})
+def token_cache_stats():
+    return jsonify(token_cache.stats())
+
+@app.cli.command('set-role')
+@click.argument('username')
+@click.argument('role', required=False)
+def set_role(username, role):
+    """Grant USERNAME a role such as admin, or remove its role when ROLE is omitted."""
+    update = {"$set": {"role": role}} if role else {"$unset": {"role": ""}}
+    if users_collection.update_one({"username": username}, update).matched_count == 0:
+        raise click.ClickException(f"User {username!r} not found")
+    click.echo(f"{username}: role {role or 'removed'}")
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 5001)))
@@ -0,0 +1,123 @@
+"""
+Salted scrypt password hashes, computed in a small process pool so the CPU and
+memory cost never blocks the threads serving requests.
+
+Stored format: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+Anything without the scrypt$ prefix is a legacy plaintext password. A malformed
+hash, or a password that is not a string, never verifies.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Work factor: scrypt uses 128 * n * r bytes of memory per hash (16 MiB by default)
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", 1))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Processes per serving worker, and how many hashes may be queued for them before further
+# callers are refused straight away
+POOL_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", POOL_WORKERS * 8))
+
+PREFIX = "scrypt$"
+
+
+class HashingBusy(Exception):
+    """Raised when MAX_PENDING hashes are already queued, or the hashing pool keeps breaking"""
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def _hash(password, n, r, p):
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    encode = base64.b64encode
+    return f"{PREFIX}{n}${r}${p}${encode(salt).decode()}${encode(digest).decode()}"
+
+
+def _verify(password, stored):
+    parts = stored.split("$")
+    if len(parts) != 6:
+        return False
+    _, n, r, p, salt, digest = parts
+    try:
+        computed = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(computed, base64.b64decode(digest))
+    except (binascii.Error, ValueError):
+        # Corrupt parameters or base64, or parameters scrypt rejects
+        return False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        # Created on first use, so each gunicorn worker gets its own pool after the fork;
+        # spawned rather than forked, since forking a threaded worker can deadlock the child
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a broken pool so the next hash starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _run(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise HashingBusy("Too many password hashes in progress")
+    try:
+        # A worker killed mid-hash (e.g. by the OOM killer) breaks the whole pool; retry once on a new one
+        for _ in range(2):
+            pool = _get_pool()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                _discard_pool(pool)
+        raise HashingBusy("Password hashing workers keep dying")
+    finally:
+        _pending.release()
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(PREFIX)
+
+
+def needs_rehash(stored):
+    """True for legacy plaintext and for hashes made with a different work factor"""
+    if not is_hashed(stored):
+        return True
+    return stored.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def hash_password(password):
+    return _run(_hash, password, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+def verify_password(password, stored):
+    if not isinstance(password, str) or not isinstance(stored, str):
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    return _run(_verify, password, stored)